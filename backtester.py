@@ -0,0 +1,212 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from config import TIMEFRAME_MACRO, TIMEFRAME_MICRO
+from candle_archive import CandleArchive
+from indicators import ema_array, rsi_array, sma_array, std_array
+from resampler import resample_ohlcv
+from strategy_analyzer import DEFAULT_PARAMS
+from utils import timeframe_to_seconds
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Backtest reguły z StrategyAnalyzer.analyze liczony wektorowo dla całej historii naraz, z lokalnych plików świec.
+
+class IndicatorCache:
+    # Pamięć podręczna serii wskaźników (LRU). Kombinacje parametrów różniące się tylko progami
+    # (np. RSI_OVERSOLD) korzystają z tej samej, raz policzonej serii.
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        value = self.entries[key] = compute()
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+def candle_file_path(data_dir, symbol, timeframe, ext='csv'):
+    return os.path.join(data_dir, f"{symbol.replace('/', '_')}_{timeframe}.{ext}")
+
+def find_candle_file(data_dir, symbol, timeframe):
+    for ext in ('parquet', 'csv'):
+        path = candle_file_path(data_dir, symbol, timeframe, ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+def load_candles(path):
+    # Plik CSV lub Parquet z kolumnami timestamp (ms), open, high, low, close, volume.
+    # Zwraca (timestamps int64, ohlcv float64 o kształcie (n, 5)) posortowane rosnąco, bez duplikatów.
+    df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    timestamps = df['timestamp'].to_numpy(dtype=np.int64)
+    ohlcv = df[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=np.float64)
+    order = np.argsort(timestamps, kind='stable')
+    timestamps, ohlcv = timestamps[order], ohlcv[order]
+    keep = np.append(timestamps[1:] != timestamps[:-1], True)
+    return timestamps[keep], ohlcv[keep]
+
+def load_symbol_data(data_dir, symbol, archive=None):
+    # (micro, macro) dla symbolu; bez pliku makro świece makro są wyliczane z mikro.
+    # archive: opcjonalne CandleArchive czytane przed plikami z data_dir (widoki na zmapowany plik, bez kopiowania)
+    if archive is not None:
+        micro = archive.read(symbol, TIMEFRAME_MICRO)
+        if len(micro[0]):
+            macro = archive.read(symbol, TIMEFRAME_MACRO)
+            return micro, macro if len(macro[0]) else resample_ohlcv(*micro, TIMEFRAME_MICRO, TIMEFRAME_MACRO)
+    micro_path = find_candle_file(data_dir, symbol, TIMEFRAME_MICRO)
+    if not micro_path:
+        return None
+    micro = load_candles(micro_path)
+    macro_path = find_candle_file(data_dir, symbol, TIMEFRAME_MACRO)
+    macro = load_candles(macro_path) if macro_path else resample_ohlcv(*micro, TIMEFRAME_MICRO, TIMEFRAME_MACRO)
+    return micro, macro
+
+def align_macro(micro_timestamps, macro_timestamps, micro_timeframe, macro_timeframe):
+    # Dla każdej świecy mikro indeks ostatniej świecy makro zamkniętej najpóźniej w chwili zamknięcia świecy mikro
+    # (bez zaglądania w przyszłość); -1, gdy żadna świeca makro nie jest jeszcze zamknięta.
+    micro_close = micro_timestamps + timeframe_to_seconds(micro_timeframe) * 1000
+    macro_close = macro_timestamps + timeframe_to_seconds(macro_timeframe) * 1000
+    return np.searchsorted(macro_close, micro_close, side='right') - 1
+
+def compute_indicators(micro, macro, params, micro_timeframe=TIMEFRAME_MICRO, macro_timeframe=TIMEFRAME_MACRO, cache=None, key=None):
+    # cache/key: opcjonalna IndicatorCache i identyfikator serii (np. symbol) do współdzielenia wyników między wywołaniami
+    cache = cache if cache is not None else IndicatorCache()
+    micro_ts, micro_ohlcv = micro
+    macro_ts, macro_ohlcv = macro
+    close, volume, macro_close = micro_ohlcv[:, 3], micro_ohlcv[:, 4], macro_ohlcv[:, 3]
+
+    idx = cache.get((key, 'align'), lambda: align_macro(micro_ts, macro_ts, micro_timeframe, macro_timeframe))
+    valid = idx >= 0
+    def on_micro(series):
+        aligned = np.full(len(idx), np.nan)
+        aligned[valid] = series[idx[valid]]
+        return aligned
+
+    p = params
+    bb_mean = cache.get((key, 'sma', p['bb_length']), lambda: sma_array(close, p['bb_length']))
+    bb_std = cache.get((key, 'std', p['bb_length']), lambda: std_array(close, p['bb_length']))
+    rsi = cache.get((key, 'rsi', p['rsi_period']), lambda: rsi_array(close, p['rsi_period']))
+    return {
+        'macro_close': cache.get((key, 'macro_close'), lambda: on_micro(macro_close)),
+        'ema_fast': cache.get((key, 'ema', p['ema_fast_period']), lambda: on_micro(ema_array(macro_close, p['ema_fast_period']))),
+        'ema_slow': cache.get((key, 'ema', p['ema_slow_period']), lambda: on_micro(ema_array(macro_close, p['ema_slow_period']))),
+        'price': close, 'volume': volume, 'rsi': rsi,
+        'prev_rsi': cache.get((key, 'prev_rsi', p['rsi_period']), lambda: np.concatenate(([np.nan], rsi[:-1]))),
+        'avg_volume': cache.get((key, 'sma_volume', p['volume_period']), lambda: sma_array(volume, p['volume_period'])),
+        'bb_lower': bb_mean - bb_std * p['bb_std'], 'bb_upper': bb_mean + bb_std * p['bb_std'],
+    }
+
+def generate_signals(ind, params):
+    # Te same warunki co StrategyAnalyzer.evaluate, dla wszystkich świec naraz (porównania z NaN dają False)
+    with np.errstate(invalid='ignore'):
+        bullish = (ind['macro_close'] > ind['ema_fast']) & (ind['ema_fast'] > ind['ema_slow'])
+        bearish = (ind['macro_close'] < ind['ema_fast']) & (ind['ema_fast'] < ind['ema_slow'])
+        volume_confirmed = ind['volume'] > ind['avg_volume'] * params['volume_multiplier']
+        rsi_buy = (ind['prev_rsi'] <= params['rsi_oversold']) & (ind['rsi'] > params['rsi_oversold'])
+        rsi_sell = (ind['prev_rsi'] >= params['rsi_overbought']) & (ind['rsi'] < params['rsi_overbought'])
+        buy = bullish & rsi_buy & (ind['price'] <= ind['bb_lower']) & volume_confirmed
+        sell = bearish & rsi_sell & (ind['price'] >= ind['bb_upper']) & volume_confirmed
+    # Jak w analysis_loop: sygnał tego samego typu nie jest powtarzany na kolejnych świecach
+    buy &= ~np.concatenate(([False], buy[:-1]))
+    sell &= ~np.concatenate(([False], sell[:-1]))
+    return buy, sell
+
+def trade_returns(close, buy, sell, hold_bars, fee):
+    # Wejście po cenie zamknięcia świecy z sygnałem, wyjście po `hold_bars` świecach; sygnały bez pełnego horyzontu są pomijane
+    entries = np.flatnonzero(buy | sell)
+    entries = entries[entries + hold_bars < len(close)]
+    direction = np.where(buy[entries], 1.0, -1.0)
+    returns = direction * (close[entries + hold_bars] / close[entries] - 1.0) - 2 * fee
+    return entries, direction, returns
+
+def summarize(returns):
+    if len(returns) == 0:
+        return {'trades': 0, 'win_rate': 0.0, 'avg_return': 0.0, 'median_return': 0.0, 'total_return': 0.0,
+                'profit_factor': 0.0, 'max_drawdown': 0.0}
+    equity = np.cumsum(returns)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity
+    gains, losses = returns[returns > 0].sum(), -returns[returns < 0].sum()
+    return {
+        'trades': int(len(returns)), 'win_rate': float((returns > 0).mean()),
+        'avg_return': float(returns.mean()), 'median_return': float(np.median(returns)),
+        'total_return': float(equity[-1]), 'profit_factor': float(gains / losses) if losses > 0 else float('inf'),
+        'max_drawdown': float(drawdown.max()),
+    }
+
+def run_backtest(micro, macro, params=None, hold_bars=24, fee=0.001, cache=None, key=None):
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    ind = compute_indicators(micro, macro, params, cache=cache, key=key)
+    buy, sell = generate_signals(ind, params)
+    entries, direction, returns = trade_returns(ind['price'], buy, sell, hold_bars, fee)
+    signals = [
+        {'type': 'BUY' if d > 0 else 'SELL', 'timestamp': int(micro[0][i]), 'price': float(ind['price'][i]), 'return': float(r)}
+        for i, d, r in zip(entries, direction, returns)
+    ]
+    stats = summarize(returns)
+    stats.update({'buy_signals': int(buy.sum()), 'sell_signals': int(sell.sum())})
+    return {'signals': signals, 'returns': returns, 'stats': stats}
+
+def discover_symbols(data_dir, timeframe=TIMEFRAME_MICRO):
+    suffix = f"_{timeframe}"
+    symbols = set()
+    for path in glob.glob(os.path.join(data_dir, f"*{suffix}.*")):
+        name = os.path.splitext(os.path.basename(path))[0][:-len(suffix)]
+        symbols.add(name.replace('_', '/', 1))
+    return sorted(symbols)
+
+def backtest_symbols(data_dir, symbols, params=None, hold_bars=24, fee=0.001, archive=None):
+    results = {}
+    for symbol in symbols:
+        data = load_symbol_data(data_dir, symbol, archive)
+        if data is None:
+            logging.warning(f"Brak pliku świec {TIMEFRAME_MICRO} dla {symbol}, pomijam.")
+            continue
+        results[symbol] = run_backtest(*data, params, hold_bars, fee)
+    all_returns = np.concatenate([r['returns'] for r in results.values()]) if results else np.array([])
+    return results, summarize(all_returns)
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest strategii EMA/RSI/BB/wolumen na lokalnych plikach świec.")
+    parser.add_argument('--data-dir', default='data', help="Katalog z plikami SYMBOL_QUOTE_interwał.csv/.parquet")
+    parser.add_argument('--symbols', nargs='*', help="Pary do testu (domyślnie wszystkie z katalogu)")
+    parser.add_argument('--hold', type=int, default=24, help="Liczba świec mikro utrzymania pozycji")
+    parser.add_argument('--fee', type=float, default=0.001, help="Prowizja za jedną transakcję (ułamek)")
+    parser.add_argument('--json', help="Zapisz wyniki (sygnały i statystyki) do pliku JSON")
+    parser.add_argument('--archive', help="Katalog archiwum świec (candle_archive.py) czytany przed --data-dir")
+    args = parser.parse_args()
+
+    archive = CandleArchive(args.archive) if args.archive else None
+    symbols = args.symbols or sorted(set(discover_symbols(args.data_dir)) |
+                                     set(archive.symbols(TIMEFRAME_MICRO) if archive else []))
+    started = time.perf_counter()
+    results, total = backtest_symbols(args.data_dir, symbols, hold_bars=args.hold, fee=args.fee, archive=archive)
+    elapsed = time.perf_counter() - started
+
+    for symbol, result in results.items():
+        stats = result['stats']
+        print(f"{symbol}: transakcje={stats['trades']} skuteczność={stats['win_rate']:.1%} "
+              f"średnio={stats['avg_return']:.2%} suma={stats['total_return']:.2%} maks. obsunięcie={stats['max_drawdown']:.2%}")
+    print(f"RAZEM: transakcje={total['trades']} skuteczność={total['win_rate']:.1%} suma={total['total_return']:.2%} "
+          f"({len(results)} par, {elapsed:.2f}s)")
+
+    if args.json:
+        output = {'summary': total, 'symbols': {s: {'stats': r['stats'], 'signals': r['signals']} for s, r in results.items()}}
+        with open(args.json, 'w') as f:
+            json.dump(output, f, indent=4)
+
+if __name__ == "__main__":
+    main()
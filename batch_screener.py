@@ -0,0 +1,130 @@
+import numpy as np
+from indicators import ema_array, rsi_array, sma_array, std_array
+
+# Przegląd wielu symboli naraz: serie wszystkich par układane są w macierze (czas x symbole), wskaźniki
+# liczone jednym wektorowym przebiegiem, a warunki StrategyAnalyzer.evaluate sprawdzane kolumnami.
+
+def stack_column(series, column, length=None):
+    # Kolumna OHLCV każdej serii jako macierz (czas x symbole) wyrównana do ostatniej świecy;
+    # krótsze historie są uzupełniane NaN na początku (wskaźniki wektorowe je pomijają)
+    if length is None:
+        length = max((len(ohlcv) for ohlcv in series), default=0)
+    matrix = np.full((length, len(series)), np.nan)
+    for j, ohlcv in enumerate(series):
+        values = ohlcv[max(len(ohlcv) - length, 0):, column]
+        if len(values):
+            matrix[length - len(values):, j] = values
+    return matrix
+
+def _last(matrix, offset=1):
+    if len(matrix) < offset:
+        return np.full(matrix.shape[1], np.nan)
+    return matrix[-offset]
+
+class BatchScreener:
+    def __init__(self, strategy_analyzer):
+        self.strategy_analyzer = strategy_analyzer
+
+    def compute(self, macro_series, micro_series):
+        # *_series: listy tablic (n, 5) zamkniętych świec, jedna na symbol, w tej samej kolejności.
+        # Zwraca najnowsze wartości wskaźników (jak compute_snapshot) jako tablice z wartością na symbol.
+        p = self.strategy_analyzer.params
+        macro_close = stack_column(macro_series, 3)
+        close = stack_column(micro_series, 3)
+        # Średnie kroczące zależą tylko od ostatniego okna - nie ma potrzeby układać całej historii
+        bb_close = close[-p['bb_length']:]
+        volume = stack_column(micro_series, 4, p['volume_period'])
+        rsi = rsi_array(close, p['rsi_period'])
+        bb_mean = _last(sma_array(bb_close, p['bb_length']))
+        bb_std = _last(std_array(bb_close, p['bb_length']))
+        return {
+            'macro_close': _last(macro_close),
+            'ema_fast': _last(ema_array(macro_close, p['ema_fast_period'])),
+            'ema_slow': _last(ema_array(macro_close, p['ema_slow_period'])),
+            'price': _last(close), 'rsi': _last(rsi), 'prev_rsi': _last(rsi, 2),
+            'volume': _last(volume), 'avg_volume': _last(sma_array(volume, p['volume_period'])),
+            'bb_lower': bb_mean - bb_std * p['bb_std'], 'bb_upper': bb_mean + bb_std * p['bb_std'],
+        }
+
+    def evaluate(self, ind):
+        # Warunki StrategyAnalyzer.evaluate dla wszystkich kolumn naraz; zwraca listę statusów w tym samym formacie
+        p = self.strategy_analyzer.params
+        with np.errstate(invalid='ignore'):
+            missing = np.isnan(ind['ema_slow']) | np.isnan(ind['bb_lower'])
+            bullish = (ind['macro_close'] > ind['ema_fast']) & (ind['ema_fast'] > ind['ema_slow'])
+            bearish = (ind['macro_close'] < ind['ema_fast']) & (ind['ema_fast'] < ind['ema_slow'])
+            oversold = ind['rsi'] <= p['rsi_oversold']
+            overbought = ind['rsi'] >= p['rsi_overbought']
+            at_lower = ind['price'] <= ind['bb_lower']
+            at_upper = ind['price'] >= ind['bb_upper']
+            volume_confirmed = ind['volume'] > ind['avg_volume'] * p['volume_multiplier']
+            rsi_buy = (ind['prev_rsi'] <= p['rsi_oversold']) & (ind['rsi'] > p['rsi_oversold'])
+            rsi_sell = (ind['prev_rsi'] >= p['rsi_overbought']) & (ind['rsi'] < p['rsi_overbought'])
+
+        trend = np.where(bullish, "WZROSTOWY", np.where(bearish, "SPADKOWY", "BOCZNY"))
+        rsi_label = np.where(oversold, "Wyprzedany", np.where(overbought, "Wykupiony", "Neutralny"))
+        bb_status = np.where(at_lower, "Cena dotyka dolnej wstęgi",
+                             np.where(at_upper, "Cena dotyka górnej wstęgi", "Cena wewnątrz wstęg"))
+
+        statuses = []
+        for j in range(len(missing)):
+            if missing[j]:
+                statuses.append({'error': 'Niewystarczająca ilość danych do analizy.'})
+                continue
+            statuses.append({
+                'trend': str(trend[j]), 'rsi': f"{rsi_label[j]} ({ind['rsi'][j]:.2f})", 'bb_status': str(bb_status[j]),
+                'volume_confirmed': bool(volume_confirmed[j]),
+                'rsi_buy_trigger': bool(rsi_buy[j]), 'rsi_sell_trigger': bool(rsi_sell[j]),
+                'bb_buy_trigger': bool(at_lower[j]), 'bb_sell_trigger': bool(at_upper[j]),
+                'rsi_value': float(ind['rsi'][j]), 'price': float(ind['price'][j]),
+                'bb_lower': float(ind['bb_lower'][j]), 'bb_upper': float(ind['bb_upper'][j]), 'error': None
+            })
+        return statuses
+
+    def screen(self, candle_store, symbols, macro_timeframe, micro_timeframe):
+        # Statusy wszystkich symboli z CandleStore (tylko zamknięte świece, jak w pętli analizy);
+        # symbole bez danych dostają None
+        available = [s for s in symbols if candle_store.has(s, macro_timeframe) and candle_store.has(s, micro_timeframe)]
+        results = dict.fromkeys(symbols)
+        if available:
+            macro = [candle_store.closed(s, macro_timeframe)[1] for s in available]
+            micro = [candle_store.closed(s, micro_timeframe)[1] for s in available]
+            results.update(zip(available, self.evaluate(self.compute(macro, micro))))
+        return results
+
+# Porównanie ze ścieżką StrategyAnalyzer.get_status dla każdej pary osobno (uruchom: python batch_screener.py)
+if __name__ == "__main__":
+    import time
+    import pandas as pd
+    from candle_store import PRICE_COLUMNS
+    from strategy_analyzer import StrategyAnalyzer, STATUS_VALUES
+
+    def random_ohlcv(rng, n):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+        spread = close * rng.uniform(0, 0.01, n)
+        return np.column_stack([close, close + spread, close - spread, close, rng.lognormal(10, 1, n)])
+
+    rng = np.random.default_rng(0)
+    analyzer = StrategyAnalyzer()
+    screener = BatchScreener(analyzer)
+    macro = [random_ohlcv(rng, int(n)) for n in rng.integers(100, 500, 300)]
+    micro = [random_ohlcv(rng, int(n)) for n in rng.integers(10, 2000, 300)]
+
+    started = time.perf_counter()
+    batch = screener.evaluate(screener.compute(macro, micro))
+    batch_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    single = [analyzer.get_status(pd.DataFrame(a, columns=PRICE_COLUMNS), pd.DataFrame(b, columns=PRICE_COLUMNS))
+              for a, b in zip(macro, micro)]
+    single_time = time.perf_counter() - started
+
+    for j, (expected, actual) in enumerate(zip(single, batch)):
+        if expected['error']:
+            assert actual['error'], (j, expected, actual)
+        else:
+            # Wartości liczbowe mogą się różnić na ostatnich miejscach po przecinku (inna kolejność działań)
+            assert all(np.isclose(expected[key], actual[key]) for key in STATUS_VALUES), (j, expected, actual)
+            assert {k: v for k, v in expected.items() if k not in STATUS_VALUES} == \
+                   {k: v for k, v in actual.items() if k not in STATUS_VALUES}, (j, expected, actual)
+    print(f"Wyniki zgodne dla {len(batch)} par: wektorowo {batch_time * 1000:.1f} ms, osobno {single_time * 1000:.1f} ms.")
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from config import TIMEFRAME_BASE, TIMEFRAME_MACRO, TIMEFRAME_MICRO, BASE_HISTORY_CANDLES, STRATEGIES
+from backtester import discover_symbols
+from candle_store import CandleStore
+from exchange_client import ExchangeClient
+from main import run_cycle
+from replay_source import ReplaySource
+from snapshot_cache import SnapshotCache
+from strategies import StrategyRegistry
+from strategy_analyzer import StrategyAnalyzer
+from telegram_bot import TelegramBot
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Pomiar wydajności potoku analizy na lokalnym źródle danych (ReplaySource) - bez giełdy i Telegrama.
+# Czasy poszczególnych etapów i pełnego cyklu analysis_loop zapisywane są do JSON, do porównywania między zmianami.
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def measure(self, name, count):
+        started = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - started
+        self.stages[name] = {'total_s': seconds, 'per_symbol_ms': seconds * 1000 / count if count else 0.0, 'count': count}
+
+def build_pipeline(source):
+    exchange_client = ExchangeClient(data_source=source)
+    candle_store = CandleStore(exchange_client, TIMEFRAME_BASE, capacity=BASE_HISTORY_CANDLES)
+    strategy_analyzer = StrategyAnalyzer()
+    snapshot_cache = SnapshotCache(candle_store, strategy_analyzer, strategy_analyzer.create_engine())
+    return exchange_client, snapshot_cache
+
+async def benchmark_symbols(source, symbols):
+    timer = StageTimer()
+    n = len(symbols)
+
+    # Etapy osobno, na świeżym potoku
+    exchange_client, snapshot_cache = build_pipeline(source)
+    store, analyzer = snapshot_cache.candle_store, snapshot_cache.strategy_analyzer
+    requests_before = source.requests
+    with timer.measure('fetch', n):
+        await store.refresh_many(symbols)
+    fetch_requests = source.requests - requests_before
+    available = [s for s in symbols if store.has(s, TIMEFRAME_MICRO)]
+
+    with timer.measure('dataframe', len(available)):
+        frames = {s: (store.frame(s, TIMEFRAME_MACRO), store.frame(s, TIMEFRAME_MICRO)) for s in available}
+    with timer.measure('get_status', len(available)):
+        statuses = {s: analyzer.get_status(*frames[s]) for s in available}
+    with timer.measure('indicator_sync_cold', len(available)):
+        for s in available:
+            snapshot_cache.evaluate(s)
+    with timer.measure('indicator_sync_warm', len(available)):
+        for s in available:
+            snapshot_cache.evaluate(s)
+    with timer.measure('batch_screen', len(available)):
+        snapshot_cache.screener.screen(store, available, TIMEFRAME_MACRO, TIMEFRAME_MICRO)
+    with timer.measure('analyze_fibonacci', len(available)):
+        fib = {s: analyzer.analyze_fibonacci(frames[s][0]) for s in available}
+
+    signal = {'type': 'BUY', 'price': 1.0, 'timestamp': datetime.now(), 'reason': 'Benchmark', 'symbol': ''}
+    with timer.measure('format', len(available)):
+        for s in available:
+            TelegramBot._format_signal_message({**signal, 'symbol': s})
+            if not fib[s].get('error'):
+                TelegramBot.format_fib_report(s, fib[s])
+    await exchange_client.close()
+
+    # Pełny cykl analysis_loop: pierwszy na pustym magazynie (pełna historia), drugi przyrostowy
+    exchange_client, snapshot_cache = build_pipeline(source)
+    last_signals, sent = {}, []
+    strategies = StrategyRegistry.from_config(snapshot_cache, STRATEGIES)
+    async def send_signal(signal):
+        sent.append(signal)
+    for name in ('cycle_cold', 'cycle_warm'):
+        with timer.measure(name, n):
+            await run_cycle(snapshot_cache, symbols, last_signals, send_signal, per_second=None, strategies=strategies)
+    await exchange_client.close()
+
+    return {
+        'symbols': n, 'analyzed': len(available), 'fetch_requests': fetch_requests,
+        'status_errors': sum(1 for status in statuses.values() if status.get('error')),
+        'signals': len(sent), 'stages': timer.stages,
+    }
+
+async def run_benchmark(sizes, candles, data_dir=None, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=0):
+    results = []
+    for size in sizes:
+        source = ReplaySource(TIMEFRAME_BASE, latency, jitter, error_rate, rate_limit_rate, seed)
+        if data_dir:
+            symbols = source.add_files(data_dir, discover_symbols(data_dir, TIMEFRAME_BASE)[:size])
+        else:
+            symbols = [f"SYM{i:04d}/USDC" for i in range(size)]
+            source.add_random_walks(symbols, candles, seed=seed)
+        logging.warning(f"Benchmark: {len(symbols)} symboli...")
+        result = await benchmark_symbols(source, symbols)
+        result['failed_requests'] = source.failures
+        results.append(result)
+        logging.warning(f"Benchmark: {len(symbols)} symboli, cykl {result['stages']['cycle_cold']['total_s']:.2f}s "
+                        f"(pierwszy), {result['stages']['cycle_warm']['total_s']:.2f}s (kolejny).")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Pomiar wydajności potoku analizy na lokalnych danych.")
+    parser.add_argument('--sizes', type=int, nargs='*', default=[10, 100, 1000], help="Liczby symboli do zmierzenia")
+    parser.add_argument('--candles', type=int, default=BASE_HISTORY_CANDLES, help="Długość syntetycznej historii")
+    parser.add_argument('--data-dir', help="Pliki świec w formacie backtestera zamiast danych syntetycznych")
+    parser.add_argument('--latency', type=float, default=0.0, help="Opóźnienie zapytania w sekundach")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json')
+    args = parser.parse_args()
+
+    # Logi INFO dla każdej świecy i symbolu zniekształciłyby pomiar
+    logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(run_benchmark(args.sizes, args.candles, args.data_dir, args.latency, args.jitter,
+                                        args.error_rate, args.rate_limit_rate, args.seed))
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(), 'python': platform.python_version(),
+        'machine': platform.machine(), 'settings': {k: v for k, v in vars(args).items() if k != 'output'},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wyniki zapisano do {args.output}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import quote, unquote
+import numpy as np
+from config import TIMEFRAME_BASE, CANDLE_ARCHIVE_DIR
+from utils import parse_symbol, qualify_symbol, timeframe_to_seconds, timeframe_offset_seconds
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Lokalne archiwum zamkniętych świec: jeden plik na (giełda, para, interwał) w katalogu
+# archiwum/giełda/para/interwał.bin. Plik to ciąg rekordów o stałej długości [timestamp int64, open, high, low,
+# close, volume float64] posortowanych po czasie, bez nagłówka - dopisanie nowych świec to dopisanie bajtów
+# na końcu, a odczyt to mapowanie pliku w pamięć (np.memmap). Kolumny zwracane są jako widoki bez kopiowania,
+# a zakres czasu wyznacza wyszukiwanie binarne po kolumnie timestamp.
+
+FIELDS = 6
+ROW_BYTES = FIELDS * 8
+EMPTY = (np.empty(0, dtype=np.int64), np.empty((0, FIELDS - 1), dtype=np.float64))
+
+def _columns(raw):
+    # raw: tablica bajtów pliku (uint8) -> (timestamps, ohlcv) jako widoki na te same dane
+    rows = len(raw) // ROW_BYTES
+    raw = raw[:rows * ROW_BYTES]
+    return raw.view(np.int64).reshape(rows, FIELDS)[:, 0], raw.view(np.float64).reshape(rows, FIELDS)[:, 1:]
+
+def _rows(timestamps, ohlcv):
+    block = np.empty((len(timestamps), FIELDS), dtype=np.float64)
+    block[:, 1:] = ohlcv
+    block.view(np.int64)[:, 0] = timestamps
+    return block
+
+class CandleArchive:
+    def __init__(self, root=CANDLE_ARCHIVE_DIR):
+        self.root = root
+
+    def path(self, symbol, timeframe):
+        exchange_id, market = parse_symbol(symbol)
+        return os.path.join(self.root, exchange_id, quote(market, safe=''), f"{timeframe}.bin")
+
+    def symbols(self, timeframe):
+        # Pary z plikiem danego interwału (w postaci używanej w monitored_symbols.json)
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for exchange_id in sorted(os.listdir(self.root)):
+            exchange_dir = os.path.join(self.root, exchange_id)
+            if not os.path.isdir(exchange_dir):
+                continue
+            for market in sorted(os.listdir(exchange_dir)):
+                if os.path.exists(os.path.join(exchange_dir, market, f"{timeframe}.bin")):
+                    found.append(qualify_symbol(exchange_id, unquote(market)))
+        return found
+
+    def _map(self, symbol, timeframe):
+        path = self.path(symbol, timeframe)
+        try:
+            if os.path.getsize(path) < ROW_BYTES:
+                return EMPTY
+        except FileNotFoundError:
+            return EMPTY
+        return _columns(np.memmap(path, dtype=np.uint8, mode='r'))
+
+    def read(self, symbol, timeframe, start_ms=None, end_ms=None):
+        # (timestamps, ohlcv) świec o czasie otwarcia w [start_ms, end_ms] - widoki na zmapowany plik
+        timestamps, ohlcv = self._map(symbol, timeframe)
+        start = int(np.searchsorted(timestamps, start_ms, side='left')) if start_ms is not None else 0
+        end = int(np.searchsorted(timestamps, end_ms, side='right')) if end_ms is not None else len(timestamps)
+        return timestamps[start:end], ohlcv[start:end]
+
+    def tail(self, symbol, timeframe, count):
+        timestamps, ohlcv = self._map(symbol, timeframe)
+        return timestamps[-count:], ohlcv[-count:]
+
+    def last_timestamp(self, symbol, timeframe):
+        timestamps = self._map(symbol, timeframe)[0]
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def append(self, symbol, timeframe, candles, now_ms=None):
+        # candles: wiersze [timestamp, open, high, low, close, volume] (np. z fetch_ohlcv_raw), posortowane rosnąco.
+        # Zapisywane są tylko świece zamknięte; znane już świece są pomijane, a brakujące ze środka historii
+        # (uzupełnianie luk) wymagają przepisania pliku. Zwraca liczbę nowych świec.
+        if not len(candles):
+            return 0
+        candles = np.asarray(candles, dtype=np.float64)
+        timestamps = candles[:, 0].astype(np.int64)
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        closed = timestamps + timeframe_to_seconds(timeframe) * 1000 <= now_ms
+        timestamps, ohlcv = timestamps[closed], candles[closed, 1:FIELDS]
+        if not len(timestamps):
+            return 0
+
+        added = 0
+        existing = self._map(symbol, timeframe)[0]
+        if len(existing):
+            # Świece nie nowsze od ostatniej zapisanej: znane są pomijane, brakujące wstawiane w środek pliku
+            older = timestamps <= existing[-1]
+            if older.any():
+                idx = np.minimum(np.searchsorted(existing, timestamps[older]), len(existing) - 1)
+                known = existing[idx] == timestamps[older]
+                if not known.all():
+                    added += self._merge(symbol, timeframe, timestamps[older][~known], ohlcv[older][~known])
+                timestamps, ohlcv = timestamps[~older], ohlcv[~older]
+        del existing
+        if len(timestamps):
+            path = self.path(symbol, timeframe)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._truncate_partial(path)
+            with open(path, 'ab') as f:
+                f.write(_rows(timestamps, ohlcv).tobytes())
+            added += len(timestamps)
+        return added
+
+    def _truncate_partial(self, path):
+        # Przerwany zapis może zostawić niepełny rekord na końcu - obcinamy go przed dopisaniem
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        if size % ROW_BYTES:
+            with open(path, 'r+b') as f:
+                f.truncate(size - size % ROW_BYTES)
+
+    def _merge(self, symbol, timeframe, timestamps, ohlcv):
+        old_timestamps, old_ohlcv = self._map(symbol, timeframe)
+        all_timestamps = np.concatenate([old_timestamps, timestamps])
+        order = np.argsort(all_timestamps, kind='stable')
+        rows = _rows(all_timestamps[order], np.concatenate([old_ohlcv, ohlcv])[order])
+        del old_timestamps, old_ohlcv
+        path = self.path(symbol, timeframe)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(rows.tobytes())
+        os.replace(tmp_path, path)
+        return len(timestamps)
+
+    def gaps(self, symbol, timeframe, start_ms=None, end_ms=None):
+        # Brakujące zakresy świec [od, do] (czasy otwarcia) między start_ms a end_ms
+        # (domyślnie od pierwszej zapisanej świecy do ostatniej zamkniętej)
+        period = timeframe_to_seconds(timeframe) * 1000
+        offset = timeframe_offset_seconds(timeframe) * 1000
+        timestamps = self._map(symbol, timeframe)[0]
+        if end_ms is None:
+            end_ms = int(time.time() * 1000) - period
+        end_ms = (end_ms - offset) // period * period + offset
+        if start_ms is None:
+            if not len(timestamps):
+                return []
+            start_ms = int(timestamps[0])
+        start_ms = -((offset - start_ms) // period) * period + offset
+        if start_ms > end_ms:
+            return []
+
+        timestamps = timestamps[(timestamps >= start_ms) & (timestamps <= end_ms)]
+        if not len(timestamps):
+            return [(start_ms, end_ms)]
+        bounds = np.concatenate([[start_ms - period], timestamps, [end_ms + period]])
+        breaks = np.flatnonzero(np.diff(bounds) > period)
+        return [(int(bounds[i]) + period, int(bounds[i + 1]) - period) for i in breaks]
+
+    async def backfill(self, exchange_client, symbol, timeframe, start_ms, end_ms=None, page_limit=1000):
+        # Pobiera z giełdy brakujące zakresy; zwraca liczbę dopisanych świec. Zakresy, których giełda nie ma
+        # (np. przerwy techniczne), zostają lukami - kolejne uzupełnianie zapyta o nie ponownie
+        period = timeframe_to_seconds(timeframe) * 1000
+        added = 0
+        for gap_start, gap_end in self.gaps(symbol, timeframe, start_ms, end_ms):
+            since = gap_start
+            while since <= gap_end:
+                limit = min(page_limit, (gap_end - since) // period + 1)
+                page = await exchange_client.fetch_ohlcv_raw(symbol, timeframe, since=since, limit=limit)
+                page = [candle for candle in page if candle[0] <= gap_end]
+                if not page:
+                    break
+                added += self.append(symbol, timeframe, page)
+                since = int(page[-1][0]) + period
+        if added:
+            logging.info(f"Uzupełniono archiwum {symbol} {timeframe}: {added} świec.")
+        return added
+
+async def _backfill_cli(symbols, timeframe, days):
+    from exchange_router import ExchangeRouter
+    archive = CandleArchive()
+    exchange_client = ExchangeRouter()
+    start_ms = int((time.time() - days * 86400) * 1000)
+    try:
+        for symbol in symbols:
+            await archive.backfill(exchange_client, symbol, timeframe, start_ms)
+            remaining = archive.gaps(symbol, timeframe, start_ms)
+            print(f"{symbol} {timeframe}: {len(archive.read(symbol, timeframe, start_ms)[0])} świec, luki: {len(remaining)}")
+    finally:
+        await exchange_client.close()
+
+# Uzupełnienie archiwum z giełdy (uruchom: python candle_archive.py --days 365)
+if __name__ == "__main__":
+    from symbol_registry import SymbolRegistry
+
+    parser = argparse.ArgumentParser(description="Uzupełnianie lokalnego archiwum świec z giełdy.")
+    parser.add_argument('--symbols', nargs='*', help="Pary (domyślnie monitorowane)")
+    parser.add_argument('--timeframe', default=TIMEFRAME_BASE)
+    parser.add_argument('--days', type=int, default=365, help="Zakres historii w dniach")
+    args = parser.parse_args()
+    asyncio.run(_backfill_cli(args.symbols or SymbolRegistry().load().symbols(), args.timeframe, args.days))
@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import time
+import numpy as np
+from metrics import SYMBOL_LAST_SUCCESS
+from resampler import resample_ohlcv
+from shared_series import create_series
+from utils import timeframe_to_seconds, SingleFlight
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+class CandleSeries:
+    # Wspólne operacje dla serii świec (timestamps, ohlcv) posortowanych rosnąco
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def last_timestamp(self):
+        return int(self.timestamps[-1]) if len(self) else None
+
+    def closed_count(self, timeframe_ms, now_ms=None):
+        # Liczba zamkniętych świec (ostatnia może być jeszcze w trakcie formowania)
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        if len(self) and self.last_timestamp + timeframe_ms > now_ms:
+            return len(self) - 1
+        return len(self)
+
+    def frame(self, limit=None):
+        import pandas as pd
+        timestamps, ohlcv = self.timestamps, self.ohlcv
+        if limit:
+            timestamps, ohlcv = timestamps[-limit:], ohlcv[-limit:]
+        index = pd.DatetimeIndex(timestamps.astype('datetime64[ms]'), name='timestamp')
+        return pd.DataFrame(ohlcv.copy(), index=index, columns=PRICE_COLUMNS)
+
+class CandleView(CandleSeries):
+    # Seria wyliczona z bufora bazowego (np. 4h z 1h)
+    def __init__(self, timestamps, ohlcv):
+        self.timestamps = timestamps
+        self.ohlcv = ohlcv
+
+class CandleBuffer(CandleSeries):
+    # Bufor pierścieniowy świec o stałej pojemności oparty na tablicach NumPy.
+    # Dane trzymane są w tablicy o podwójnej pojemności, dzięki czemu ostatnie `capacity` świec
+    # zawsze tworzy ciągły wycinek - odczyt to widok bez kopiowania.
+    # shared: tablice w pamięci współdzielonej, czytane bez kopiowania przez procesy analizy (workers.py)
+    def __init__(self, capacity, shared=False):
+        self.capacity = capacity
+        self.shm = None
+        if shared:
+            self.shm, self._ts, self._data = create_series(2 * capacity)
+            self._ts[:] = 0
+            self._data[:] = 0.0
+        else:
+            self._ts = np.zeros(2 * capacity, dtype=np.int64)
+            self._data = np.zeros((2 * capacity, len(PRICE_COLUMNS)), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+        self.version = 0  # Zwiększana przy każdej zmianie danych
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def timestamps(self):
+        return self._ts[self._start:self._end]
+
+    @property
+    def ohlcv(self):
+        return self._data[self._start:self._end]
+
+    def shared_ref(self):
+        # (nazwa bloku, rozmiar tablic, początek, koniec) - wystarczy innemu procesowi do odczytu bieżących świec.
+        # Wycinek jest poprawny tylko do następnej zmiany bufora: już drugie dopisanie po przeniesieniu świec
+        # na początek tablicy (w _append) nadpisuje jego część, a pełne przeładowanie zwalnia cały blok.
+        # Dlatego CandleStore zmienia bufory wyłącznie pod CandleStore.lock, którą na czas odczytu
+        # trzyma AnalysisWorkers.analyze.
+        return self.shm.name, len(self._ts), self._start, self._end
+
+    def release(self):
+        # Zwalnia pamięć współdzieloną; bufor nie nadaje się potem do użycia
+        if self.shm is not None:
+            self._ts = self._data = None
+            self.shm.unlink()
+            try:
+                self.shm.close()
+            except BufferError:
+                pass  # Widoki tablic wciąż w użyciu - pamięć zostanie zwolniona razem z nimi
+            self.shm = None
+
+    def _append(self, ts, values):
+        if self._end == len(self._ts):
+            # Koniec tablicy - przenosimy najnowsze świece na początek (raz na `capacity` dopisań)
+            keep = min(len(self), self.capacity - 1)
+            self._ts[:keep] = self._ts[self._end - keep:self._end]
+            self._data[:keep] = self._data[self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        self._ts[self._end] = ts
+        self._data[self._end] = values
+        self._end += 1
+        if len(self) > self.capacity:
+            self._start += 1
+
+    def load(self, rows):
+        # Wczytanie całej serii naraz (np. z zapisanego stanu); rows: tablica [timestamp, open, ..., volume]
+        rows = rows[-self.capacity:]
+        n = len(rows)
+        self._ts[:n] = rows[:, 0]
+        self._data[:n] = rows[:, 1:6]
+        self._start, self._end = 0, n
+        self.version += 1
+
+    def update(self, ohlcv):
+        # ohlcv: lista [timestamp, open, high, low, close, volume] posortowana rosnąco.
+        # Nowe świece są dopisywane, a świeca o znanym czasie (np. wciąż formująca się) nadpisywana w miejscu.
+        # Zwraca liczbę nowych świec.
+        added = 0
+        for candle in ohlcv:
+            ts = int(candle[0])
+            last = self.last_timestamp
+            if last is None or ts > last:
+                self._append(ts, candle[1:6])
+                added += 1
+            elif ts == last:
+                self._data[self._end - 1] = candle[1:6]
+            else:
+                idx = self._start + int(np.searchsorted(self.timestamps, ts))
+                if idx < self._end and self._ts[idx] == ts:
+                    self._data[idx] = candle[1:6]
+        self.version += 1
+        return added
+
+class CandleStore:
+    # Przyrostowy magazyn świec: z giełdy pobierany jest wyłącznie interwał bazowy (pełna historia raz,
+    # potem tylko najnowsze świece), a wyższe interwały są z niego wyliczane lokalnie.
+    def __init__(self, exchange_client, base_timeframe, capacity=2000, page_limit=1000, shared=False, archive=None):
+        self.exchange_client = exchange_client
+        self.archive = archive  # Opcjonalne CandleArchive: historia czytana najpierw z dysku, pobrane świece dopisywane
+        self.base_timeframe = base_timeframe
+        self.capacity = capacity  # W świecach interwału bazowego
+        self.page_limit = page_limit
+        self.shared = shared  # Bufory w pamięci współdzielonej (tryb z procesami analizy)
+        self.buffers = {}
+        self.refreshed_at = {}  # symbol -> czas (time.time()) ostatniego udanego odświeżenia
+        self._views = {}
+        self._flight = SingleFlight()
+        # Zmiany buforów (dopisanie, przeładowanie) czekają, aż procesy analizy skończą czytać bieżące wycinki
+        # (AnalysisWorkers.analyze); pobieranie z giełdy odbywa się poza blokadą
+        self.lock = asyncio.Lock()
+
+    def get(self, symbol, timeframe):
+        buffer = self.buffers.get(symbol)
+        if buffer is None or timeframe == self.base_timeframe:
+            return buffer
+        cached = self._views.get((symbol, timeframe))
+        if cached and cached[0] is buffer and cached[1] == buffer.version:
+            return cached[2]
+        view = CandleView(*resample_ohlcv(buffer.timestamps, buffer.ohlcv, self.base_timeframe, timeframe))
+        self._views[(symbol, timeframe)] = (buffer, buffer.version, view)
+        return view
+
+    def has(self, symbol, timeframe):
+        series = self.get(symbol, timeframe)
+        return series is not None and len(series) > 0
+
+    def closed(self, symbol, timeframe, now_ms=None):
+        # Widoki (timestamps, ohlcv) tylko zamkniętych świec
+        series = self.get(symbol, timeframe)
+        n = series.closed_count(timeframe_to_seconds(timeframe) * 1000, now_ms)
+        return series.timestamps[:n], series.ohlcv[:n]
+
+    def frame(self, symbol, timeframe, limit=None):
+        import pandas as pd
+        series = self.get(symbol, timeframe)
+        return series.frame(limit) if series is not None else pd.DataFrame(columns=PRICE_COLUMNS)
+
+    async def _fetch_since(self, symbol, since, now_ms, timeframe_ms):
+        # Pobieranie stronami (giełdy ograniczają liczbę świec w jednym zapytaniu)
+        candles = []
+        while since <= now_ms:
+            limit = min(self.page_limit, (now_ms - since) // timeframe_ms + 1)
+            page = await self.exchange_client.fetch_ohlcv_raw(symbol, self.base_timeframe, since=since, limit=limit)
+            if not page:
+                break
+            candles.extend(page)
+            if len(page) < limit:
+                break
+            since = int(page[-1][0]) + timeframe_ms
+        return candles
+
+    def age(self, symbol):
+        refreshed_at = self.refreshed_at.get(symbol)
+        return time.time() - refreshed_at if refreshed_at else float('inf')
+
+    async def refresh(self, symbol):
+        # Odświeża serię bazową symbolu (wyższe interwały są z niej wyliczane);
+        # równoczesne odświeżenia tego samego symbolu wykonują jedno zapytanie
+        return await self._flight.run(symbol, lambda: self._refresh(symbol))
+
+    def _load_archived(self, symbol, since):
+        # Historia z lokalnego archiwum (bez zapytań do giełdy); None, gdy archiwum nie ma świec z tego zakresu
+        timestamps, ohlcv = self.archive.read(symbol, self.base_timeframe, start_ms=since)
+        if not len(timestamps):
+            return None
+        rows = np.empty((len(timestamps), len(PRICE_COLUMNS) + 1), dtype=np.float64)
+        rows[:, 0] = timestamps
+        rows[:, 1:] = ohlcv
+        buffer = CandleBuffer(self.capacity, shared=self.shared)
+        buffer.load(rows)
+        return buffer
+
+    async def _replace(self, symbol, buffer):
+        # Podmiana bufora symbolu (poprzedni jest zwalniany) - pod blokadą, jak każda zmiana czytana przez procesy analizy
+        async with self.lock:
+            if symbol in self.buffers:
+                self.buffers[symbol].release()
+            self.buffers[symbol] = buffer
+
+    def _archive(self, symbol, ohlcv, now_ms):
+        if self.archive is not None:
+            try:
+                self.archive.append(symbol, self.base_timeframe, ohlcv, now_ms)
+            except OSError as e:
+                logging.error(f"Błąd zapisu archiwum świec {symbol}: {e}")
+
+    async def _refresh(self, symbol):
+        buffer = self.buffers.get(symbol)
+        timeframe_ms = timeframe_to_seconds(self.base_timeframe) * 1000
+        now_ms = int(time.time() * 1000)
+        since = (now_ms // timeframe_ms - self.capacity + 1) * timeframe_ms
+        if (buffer is None or not len(buffer)) and self.archive is not None:
+            # Pierwsze użycie symbolu: luki w archiwum (także od ostatniej zapisanej świecy do teraz) są uzupełniane
+            # z giełdy, a bufor wczytywany z dysku - kolejne odświeżenia pobierają już tylko nowe świece
+            await self.archive.backfill(self.exchange_client, symbol, self.base_timeframe, since, page_limit=self.page_limit)
+            archived = self._load_archived(symbol, since)
+            if archived is not None:
+                await self._replace(symbol, archived)
+                buffer = archived
+
+        if buffer is not None and len(buffer):
+            # Brakujące świece od ostatniej znanej (włącznie z nią - mogła się jeszcze zmienić)
+            if (now_ms - buffer.last_timestamp) // timeframe_ms < self.capacity:
+                ohlcv = await self._fetch_since(symbol, buffer.last_timestamp, now_ms, timeframe_ms)
+                if ohlcv:
+                    async with self.lock:
+                        buffer.update(ohlcv)
+                    self.refreshed_at[symbol] = time.time()
+                    self._archive(symbol, ohlcv, now_ms)
+                return buffer
+            logging.info(f"Przerwa w danych {symbol} {self.base_timeframe} dłuższa niż bufor, pobieram pełną historię.")
+
+        ohlcv = await self._fetch_since(symbol, since, now_ms, timeframe_ms)
+        if not ohlcv:
+            return buffer
+        self._archive(symbol, ohlcv, now_ms)
+        buffer = CandleBuffer(self.capacity, shared=self.shared)
+        buffer.update(ohlcv)
+        await self._replace(symbol, buffer)
+        self.refreshed_at[symbol] = time.time()
+        return buffer
+
+    def restore(self, symbol, rows, refreshed_at):
+        # Seria z zapisanego stanu; kolejne odświeżenie pobierze tylko świece od ostatniej zapisanej
+        buffer = CandleBuffer(self.capacity, shared=self.shared)
+        buffer.load(rows)
+        if symbol in self.buffers:
+            self.buffers[symbol].release()
+        self.buffers[symbol] = buffer
+        self.refreshed_at[symbol] = refreshed_at
+        self._views = {key: view for key, view in self._views.items() if key[0] != symbol}
+
+    async def refresh_many(self, symbols, per_second=None):
+        # per_second: rozłożenie startu zapytań w czasie, aby nie przekroczyć budżetu zapytań giełdy
+        async def delayed(i, symbol):
+            if per_second:
+                await asyncio.sleep(i / per_second)
+            return await self.refresh(symbol)
+        return await asyncio.gather(*(delayed(i, symbol) for i, symbol in enumerate(dict.fromkeys(symbols))))
+
+    def retain(self, symbols):
+        # Usuwa bufory symboli, które nie są już monitorowane
+        symbols = set(symbols)
+        for symbol in [symbol for symbol in self.buffers if symbol not in symbols]:
+            self.buffers.pop(symbol).release()
+            self.refreshed_at.pop(symbol, None)
+            SYMBOL_LAST_SUCCESS.remove(symbol)
+        for key in [key for key in self._views if key[0] not in symbols]:
+            del self._views[key]
+
+    def close(self):
+        for buffer in self.buffers.values():
+            buffer.release()
+        self.buffers.clear()
+        self._views.clear()
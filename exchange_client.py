@@ -1,79 +1,237 @@
-import ccxt
+import asyncio
 import logging
 import time
-import pandas as pd
-from config import EXCHANGE_ID, BINANCE_API_KEY, BINANCE_SECRET_KEY
+import aiohttp
+from config import (
+    EXCHANGE_ID, BINANCE_API_KEY, BINANCE_SECRET_KEY, EXCHANGE_CREDENTIALS,
+    MAX_CONCURRENT_REQUESTS, FETCH_RETRIES, FETCH_RETRY_BACKOFF,
+    MARKETS_CACHE_TTL, MARKETS_MIN_RELOAD_INTERVAL,
+    REQUEST_BUDGET_PER_SECOND, EXCHANGE_RATE_LIMITS, EXCHANGE_REQUEST_WEIGHTS
+)
+from market_cache import MarketCache
+from metrics import FETCH_SECONDS, FETCH_RESULTS, FETCH_CANDLES, SYMBOL_LAST_SUCCESS, timed
+from rate_limiter import TokenBucket
+from utils import qualify_symbol
 
 # Ustawienie logowania
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+def load_ccxt():
+    # ccxt importuje klasy wszystkich giełd, co trwa sekundy - import przy pierwszym użyciu, nie przy starcie bota
+    import ccxt.async_support as ccxt
+    return ccxt
+
 class ExchangeClient:
-    def __init__(self):
-        self.exchange = self._init_exchange()
+    # Klient jednej giełdy; wiele giełd naraz obsługuje exchange_router.ExchangeRouter
+    def __init__(self, exchange_id=EXCHANGE_ID, data_source=None, rate_limiter=None):
+        # data_source: zamiast giełdy ccxt dowolny obiekt o tym samym interfejsie (load_markets, fetch_ohlcv,
+        # symbols, timeframes, close), np. replay_source.ReplaySource do testów i pomiarów bez połączenia.
+        # rate_limiter: budżet zapytań (TokenBucket); domyślnie z EXCHANGE_RATE_LIMITS, a dla data_source bez limitu
+        self.exchange_id = exchange_id
+        self.session = None
+        self.uses_http = data_source is None
+        # Ogranicza liczbę jednoczesnych zapytań do giełdy (wspólny limit dla wszystkich zadań)
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        if rate_limiter is None and data_source is None:
+            rate_limiter = TokenBucket(**EXCHANGE_RATE_LIMITS.get(exchange_id, {'rate': REQUEST_BUDGET_PER_SECOND}))
+        self.rate_limiter = rate_limiter
+        self.weights = EXCHANGE_REQUEST_WEIGHTS.get(exchange_id, {})
+        self.exchange = self._init_exchange() if data_source is None else data_source
+        self.markets = MarketCache(self.exchange, MARKETS_CACHE_TTL, MARKETS_MIN_RELOAD_INTERVAL, exchange_id)
+        self.partial_markets = False  # ccxt zna opisy tylko części rynków (z zapisanego stanu)
+        self.fetch_ok, self.fetch_empty, self.fetch_error = (FETCH_RESULTS.labels(exchange_id, result)
+                                                             for result in ('ok', 'empty', 'error'))
 
     def _init_exchange(self):
         try:
-            exchange_class = getattr(ccxt, EXCHANGE_ID)
+            exchange_class = getattr(load_ccxt(), self.exchange_id)
+            credentials = EXCHANGE_CREDENTIALS.get(self.exchange_id, {})
+            if self.exchange_id == 'binance' and not credentials:
+                credentials = {'apiKey': BINANCE_API_KEY, 'secret': BINANCE_SECRET_KEY}
             exchange = exchange_class({
-                'apiKey': BINANCE_API_KEY,
-                'secret': BINANCE_SECRET_KEY,
-                'enableRateLimit': True, # Włączanie kontroli limitu zapytań
+                **credentials,
+                # Wbudowany limiter ccxt tylko bez własnego budżetu (TokenBucket) - inaczej każde zapytanie
+                # byłoby spowalniane dwa razy, a rzeczywiste tempo niższe niż ustawione w EXCHANGE_RATE_LIMITS
+                'enableRateLimit': self.rate_limiter is None,
             })
-            logging.info(f"Pomyślnie zainicjowano giełdę: {EXCHANGE_ID}")
+            logging.info(f"Pomyślnie zainicjowano giełdę: {self.exchange_id}")
             return exchange
         except Exception as e:
-            logging.error(f"Błąd inicjalizacji giełdy {EXCHANGE_ID}: {e}")
+            logging.error(f"Błąd inicjalizacji giełdy {self.exchange_id}: {e}")
             return None
 
-    def fetch_ohlcv(self, symbol, timeframe, limit=100):
+    def _ensure_session(self):
+        # Jedna współdzielona sesja HTTP z pulą połączeń (keep-alive) dla wszystkich zapytań
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_REQUESTS, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(connector=connector)
+            self.exchange.session = self.session
+            self.exchange.own_session = False
+
+    async def _call(self, method, *args, **kwargs):
+        # Wywołanie metody giełdy z ograniczeniem współbieżności i nieblokującym ponawianiem
+        if self.uses_http:
+            self._ensure_session()
+        ccxt = load_ccxt()
+        delay = FETCH_RETRY_BACKOFF
+        for attempt in range(1, FETCH_RETRIES + 1):
+            if self.rate_limiter:
+                await self.rate_limiter.acquire(self._weight(method, kwargs.get('limit')))
+            async with self.semaphore:
+                try:
+                    return await getattr(self.exchange, method)(*args, **kwargs)
+                except ccxt.NetworkError as e:
+                    if isinstance(e, ccxt.RateLimitExceeded) and self.rate_limiter:
+                        # Limit giełdy przekroczony - wstrzymujemy wszystkie zapytania do niej, nie tylko to jedno
+                        self.rate_limiter.pause(delay)
+                    if attempt == FETCH_RETRIES:
+                        raise
+                    logging.warning(f"Błąd sieci {self.exchange_id} ({method}), próba {attempt}/{FETCH_RETRIES}, "
+                                    f"ponawiam za {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+            delay *= 2
+
+    def _weight(self, method, limit=None):
+        # Waga zapytania w budżecie: liczba albo progi [do_limitu, waga] (None - bez górnej granicy) według limit;
+        # bez limitu w zapytaniu liczona jest najwyższa waga, żeby budżet nie był zaniżony
+        weight = self.weights.get(method, 1)
+        if not isinstance(weight, (list, tuple)):
+            return weight
+        if limit is not None:
+            for upto, tier_weight in weight:
+                if upto is None or limit <= upto:
+                    return tier_weight
+        return weight[-1][1]
+
+    async def _load_markets(self):
+        # Pełne pobranie listy rynków - wywoływane wyłącznie przez MarketCache
+        await self._call('load_markets', True)
+
+    def start_market_refresh(self):
+        # Odświeżanie metadanych rynków w tle, poza ścieżką pobierania świec
+        if self.exchange:
+            return self.markets.start_background_refresh(self._load_markets)
+
+    def invalidate_markets(self):
+        self.markets.invalidate()
+
+    def market_state(self, symbols):
+        # Lista rynków i interwałów oraz pełne opisy rynków podanych par (potrzebne ccxt do zapytań)
+        markets = getattr(self.exchange, 'markets', None) or {}
+        return {
+            'symbols': sorted(self.markets.symbols), 'timeframes': sorted(self.markets.timeframes),
+            'markets': {symbol: markets[symbol] for symbol in symbols if symbol in markets},
+        }
+
+    def restore_markets(self, state, age):
+        # Zapisane metadane zamiast load_markets przy starcie; po upływie MARKETS_CACHE_TTL od zapisu
+        # lista jest przeładowywana jak zwykle. Opisy rynków zapisywane są tylko dla monitorowanych par -
+        # para dodana po starcie wymusza pełne przeładowanie (_ensure_market)
+        if not self.exchange or not state.get('symbols'):
+            return
+        if state.get('markets') and hasattr(self.exchange, 'set_markets'):
+            self.exchange.set_markets(state['markets'])
+            self.partial_markets = True
+        self.markets.restore(state['symbols'], state.get('timeframes', []), age)
+
+    @timed(FETCH_SECONDS)
+    async def fetch_ohlcv_raw(self, symbol, timeframe, since=None, limit=100):
+        # Surowe świece [timestamp, open, high, low, close, volume]; pusta lista w razie błędu
+        ohlcv = await self._fetch_ohlcv_raw(symbol, timeframe, since, limit)
+        if ohlcv is None:
+            self.fetch_error.inc()
+            return []
+        if ohlcv:
+            self.fetch_ok.inc()
+            FETCH_CANDLES.inc(len(ohlcv))
+            SYMBOL_LAST_SUCCESS.labels(qualify_symbol(self.exchange_id, symbol)).set(time.time())
+        else:
+            self.fetch_empty.inc()
+        return ohlcv
+
+    async def _fetch_ohlcv_raw(self, symbol, timeframe, since, limit):
+        # None oznacza błąd (liczony osobno od pustej odpowiedzi)
         if not self.exchange:
             logging.error("Giełda nie jest zainicjowana.")
-            return pd.DataFrame()
+            return None
 
+        ccxt = load_ccxt()
         try:
-            # Sprawdzanie, czy symbol i interwał są obsługiwane
-            self.exchange.load_markets()
-            if symbol not in self.exchange.symbols:
-                logging.error(f"Symbol {symbol} nie jest obsługiwany przez giełdę {EXCHANGE_ID}.")
-                return pd.DataFrame()
-            if timeframe not in self.exchange.timeframes:
-                logging.error(f"Interwał czasowy {timeframe} nie jest obsługiwany przez giełdę {EXCHANGE_ID}.")
-                return pd.DataFrame()
-            
-            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            df.set_index('timestamp', inplace=True)
-            logging.info(f"Pomyślnie pobrano {len(df)} świec dla {symbol} {timeframe}.")
-            return df
+            # Sprawdzanie, czy symbol i interwał są obsługiwane (z pamięci podręcznej rynków)
+            await self.markets.ensure_loaded(self._load_markets)
+            if symbol not in self.markets.symbols:
+                logging.error(f"Symbol {symbol} nie jest obsługiwany przez giełdę {self.exchange_id}.")
+                return None
+            if timeframe not in self.markets.timeframes:
+                logging.error(f"Interwał czasowy {timeframe} nie jest obsługiwany przez giełdę {self.exchange_id}.")
+                return None
+            await self._ensure_market(symbol)
+
+            ohlcv = await self._call('fetch_ohlcv', symbol, timeframe, since=since, limit=limit)
+            # DEBUG - liczba pobranych świec i czasy zapytań są w metrykach (bot_fetch_ohlcv_*)
+            logging.debug(f"Pomyślnie pobrano {len(ohlcv)} świec dla {symbol} {timeframe}.")
+            return ohlcv
         except ccxt.NetworkError as e:
             logging.error(f"Błąd sieci podczas pobierania danych: {e}")
-            time.sleep(5) # Odczekaj przed ponowną próbą
-            return pd.DataFrame()
+            return None
         except ccxt.ExchangeError as e:
             logging.error(f"Błąd giełdy podczas pobierania danych: {e}")
-            return pd.DataFrame()
+            return None
         except Exception as e:
             logging.error(f"Nieznany błąd podczas pobierania danych: {e}")
+            return None
+
+    async def _ensure_market(self, symbol):
+        # Bez opisu rynku w ccxt zapytanie kończy się BadSymbol - przeładowujemy pełną listę raz, zamiast czekać na TTL
+        if self.partial_markets and symbol not in (self.exchange.markets or {}):
+            logging.info(f"Brak opisu rynku {symbol} w zapisanym stanie, przeładowuję listę rynków {self.exchange_id}.")
+            self.markets.invalidate()
+            await self.markets.refresh(self._load_markets)
+            self.partial_markets = False
+
+    async def fetch_ohlcv(self, symbol, timeframe, limit=100):
+        import pandas as pd
+        ohlcv = await self.fetch_ohlcv_raw(symbol, timeframe, limit=limit)
+        if not ohlcv:
             return pd.DataFrame()
+        df = pd.DataFrame(ohlcv, columns=OHLCV_COLUMNS)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        df.set_index('timestamp', inplace=True)
+        return df
 
-    def symbol_exists(self, symbol):
+    async def fetch_many(self, requests):
+        # Równoległe pobieranie wielu serii; requests to lista krotek (symbol, interwał, limit).
+        # Wyniki w tej samej kolejności co zapytania.
+        return await asyncio.gather(*(self.fetch_ohlcv(symbol, timeframe, limit) for symbol, timeframe, limit in requests))
+
+    async def symbol_exists(self, symbol):
         if not self.exchange:
             return False
         try:
-            # Używamy reload=True, aby upewnić się, że lista rynków jest aktualna
-            self.exchange.load_markets(reload=True) 
-            return symbol in self.exchange.markets
+            # Lista rynków jest przeładowywana tylko, gdy symbolu brak w pamięci podręcznej, a ta nie jest świeża
+            return await self.markets.has_symbol(symbol, self._load_markets)
         except Exception as e:
             logging.error(f"Błąd podczas walidacji symbolu {symbol}: {e}")
             return False
 
+    async def close(self):
+        await self.markets.stop_background_refresh()
+        if self.exchange:
+            await self.exchange.close()
+        if self.session and not self.session.closed:
+            await self.session.close()
+
 # Przykład użycia (można usunąć po testach)
 # if __name__ == "__main__":
-#     client = ExchangeClient()
-#     # Test walidacji symbolu
-#     print(f"Czy BTC/USDC istnieje? {client.symbol_exists('BTC/USDC')}")
-#     print(f"Czy FAKE/COIN istnieje? {client.symbol_exists('FAKE/COIN')}")
-#     # Test pobierania danych
-#     df = client.fetch_ohlcv('BTC/USDC', '1h', limit=10)
-#     print(df)
+#     async def demo():
+#         client = ExchangeClient()
+#         # Test walidacji symbolu
+#         print(f"Czy BTC/USDC istnieje? {await client.symbol_exists('BTC/USDC')}")
+#         print(f"Czy FAKE/COIN istnieje? {await client.symbol_exists('FAKE/COIN')}")
+#         # Test pobierania danych
+#         df = await client.fetch_ohlcv('BTC/USDC', '1h', limit=10)
+#         print(df)
+#         await client.close()
+#     asyncio.run(demo())
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from exchange_client import ExchangeClient, load_ccxt
+from utils import parse_symbol
+
+class ExchangeRouter:
+    # Wiele giełd naraz: jeden klient (z własną pulą połączeń i budżetem zapytań) na giełdę, tworzony przy
+    # pierwszym użyciu. Metody przyjmują symbole w postaci "giełda:PARA" (bez prefiksu - giełda domyślna),
+    # więc router można podać wszędzie tam, gdzie dotąd ExchangeClient (np. CandleStore).
+    def __init__(self, data_sources=None):
+        self.data_sources = data_sources or {}  # giełda -> źródło danych (np. ReplaySource) zamiast ccxt
+        self.clients = {}
+        self._refresh_markets = False
+
+    def is_supported(self, exchange_id):
+        return exchange_id in self.data_sources or exchange_id in load_ccxt().exchanges
+
+    def client(self, exchange_id):
+        client = self.clients.get(exchange_id)
+        if client is None:
+            client = self.clients[exchange_id] = ExchangeClient(exchange_id, data_source=self.data_sources.get(exchange_id))
+            if self._refresh_markets:
+                client.start_market_refresh()
+        return client
+
+    async def fetch_ohlcv_raw(self, symbol, timeframe, since=None, limit=100):
+        exchange_id, market = parse_symbol(symbol)
+        if not self.is_supported(exchange_id):
+            logging.error(f"Nieznana giełda '{exchange_id}' w symbolu {symbol}.")
+            return []
+        return await self.client(exchange_id).fetch_ohlcv_raw(market, timeframe, since=since, limit=limit)
+
+    async def fetch_ohlcv(self, symbol, timeframe, limit=100):
+        exchange_id, market = parse_symbol(symbol)
+        return await self.client(exchange_id).fetch_ohlcv(market, timeframe, limit=limit)
+
+    async def fetch_many(self, requests):
+        # Zapytania do różnych giełd idą równolegle; każda giełda pilnuje tylko własnego budżetu
+        return await asyncio.gather(*(self.fetch_ohlcv(symbol, timeframe, limit) for symbol, timeframe, limit in requests))
+
+    async def symbol_exists(self, symbol):
+        exchange_id, market = parse_symbol(symbol)
+        if not self.is_supported(exchange_id):
+            return False
+        return await self.client(exchange_id).symbol_exists(market)
+
+    def market_state(self, symbols):
+        # Metadane rynków każdej giełdy do zapisu stanu (warm_state.py); pełne opisy tylko dla podanych par
+        markets = {}
+        for symbol in symbols:
+            exchange_id, market = parse_symbol(symbol)
+            markets.setdefault(exchange_id, []).append(market)
+        return {exchange_id: client.market_state(markets.get(exchange_id, []))
+                for exchange_id, client in self.clients.items() if client.markets.is_loaded()}
+
+    def restore_markets(self, state, age):
+        for exchange_id, client_state in state.items():
+            if self.is_supported(exchange_id):
+                self.client(exchange_id).restore_markets(client_state, age)
+
+    def start_market_refresh(self):
+        self._refresh_markets = True
+        for client in self.clients.values():
+            client.start_market_refresh()
+
+    async def close(self):
+        await asyncio.gather(*(client.close() for client in self.clients.values()))
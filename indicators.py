@@ -0,0 +1,326 @@
+import math
+from collections import deque
+from datetime import datetime, timezone
+import numpy as np
+from config import EMA_FAST_PERIOD, EMA_SLOW_PERIOD, RSI_PERIOD, BB_LENGTH, BB_STD
+
+VOLUME_AVG_PERIOD = 20
+NAN = float('nan')
+PENDING_BARS = 64  # Ile wartości świec czekających na analizę (take_missed) trzymać dla jednego symbolu
+
+# Wskaźniki strumieniowe: każda nowa świeca (update) lub korekta ostatniej, wciąż formującej się świecy (revise)
+# kosztuje stały czas, niezależnie od długości historii. Wyniki odpowiadają pandas_ta.
+
+class StreamingIndicator:
+    # Stan przechowywany jest jako niezmienna krotka: _base to stan po przedostatniej świecy,
+    # dzięki czemu korekta ostatniej świecy to ponowne wykonanie jednego kroku.
+    def __init__(self):
+        self._base = self._initial_state()
+        self._state = None
+        self.value = NAN
+        self.prev_value = NAN
+
+    def _initial_state(self):
+        raise NotImplementedError
+
+    def _step(self, state, x):
+        raise NotImplementedError
+
+    def update(self, x):
+        if self._state is not None:
+            self._base = self._state
+            self.prev_value = self.value
+        self._state, self.value = self._step(self._base, x)
+        return self.value
+
+    def revise(self, x):
+        if self._state is None:
+            return self.update(x)
+        self._state, self.value = self._step(self._base, x)
+        return self.value
+
+class EMA(StreamingIndicator):
+    # Jak ta.ema: pierwsza wartość to SMA z `length` świec, dalej ewm(span=length, adjust=False)
+    def __init__(self, length):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        super().__init__()
+
+    def _initial_state(self):
+        return (0, 0.0)
+
+    def _step(self, state, x):
+        count, acc = state
+        count += 1
+        if count < self.length:
+            return (count, acc + x), NAN
+        if count == self.length:
+            value = (acc + x) / self.length
+        else:
+            value = acc + self.alpha * (x - acc)
+        return (count, value), value
+
+class RSI(StreamingIndicator):
+    # Jak ta.rsi: średnie zysków i strat liczone wygładzaniem Wildera (rma, alpha=1/length).
+    # pandas_ta liczy rma przez ewm(adjust=True), stąd ważone sumy zamiast klasycznej rekurencji.
+    def __init__(self, length):
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        super().__init__()
+
+    def _initial_state(self):
+        # (poprzednie zamknięcie, liczba zmian, suma ważona zysków, suma ważona strat);
+        # wspólny mianownik średnich skraca się w ilorazie RSI
+        return (None, 0, 0.0, 0.0)
+
+    def _step(self, state, x):
+        prev_close, count, gain, loss = state
+        if prev_close is None:
+            return (x, 0, 0.0, 0.0), NAN
+        change = x - prev_close
+        gain = max(change, 0.0) + self.decay * gain
+        loss = max(-change, 0.0) + self.decay * loss
+        count += 1
+        value = NAN
+        if count >= self.length and gain + loss > 0:
+            value = 100.0 * gain / (gain + loss)
+        return (x, count, gain, loss), value
+
+class RollingStats:
+    # Średnia i odchylenie standardowe (ddof=0, jak ta.bbands) w oknie o stałej długości,
+    # aktualizowane algorytmem Welforda przy dodaniu i usunięciu wartości z okna.
+    RESYNC_EVERY = 1000
+
+    def __init__(self, length):
+        self.length = length
+        self.window = deque()
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._updates = 0
+        self.prev_mean = NAN
+        self.prev_std = NAN
+
+    def _push(self, x):
+        self.window.append(x)
+        delta = x - self._mean
+        self._mean += delta / len(self.window)
+        self._m2 += delta * (x - self._mean)
+
+    def _remove(self, x):
+        n = len(self.window)
+        if n == 0:
+            self._mean, self._m2 = 0.0, 0.0
+            return
+        delta = x - self._mean
+        self._mean -= delta / n
+        self._m2 -= delta * (x - self._mean)
+
+    def _resync(self):
+        # Okresowe przeliczenie od zera ogranicza narastanie błędów zaokrągleń
+        n = len(self.window)
+        self._mean = sum(self.window) / n if n else 0.0
+        self._m2 = sum((v - self._mean) ** 2 for v in self.window)
+
+    def update(self, x):
+        self.prev_mean, self.prev_std = self.mean, self.std
+        self._push(x)
+        if len(self.window) > self.length:
+            self._remove(self.window.popleft())
+        self._updates += 1
+        if self._updates % self.RESYNC_EVERY == 0:
+            self._resync()
+
+    def revise(self, x):
+        if not self.window:
+            return self.update(x)
+        self._remove(self.window.pop())
+        self._push(x)
+
+    @property
+    def mean(self):
+        return self._mean if len(self.window) >= self.length else NAN
+
+    @property
+    def std(self):
+        return math.sqrt(max(self._m2, 0.0) / len(self.window)) if len(self.window) >= self.length else NAN
+
+class IndicatorState:
+    # Stan wskaźników jednego symbolu: EMA na interwale makro, RSI, średni wolumen i wstęgi Bollingera na mikro
+    def __init__(self, ema_fast_period, ema_slow_period, rsi_period, bb_length, volume_period):
+        self.periods = (ema_fast_period, ema_slow_period, rsi_period, bb_length, volume_period)
+        self.pending = deque(maxlen=PENDING_BARS)  # (czas świecy mikro, wartości po niej) od ostatniego take_missed
+        self.reset_macro()
+        self.reset_micro()
+
+    def reset_macro(self):
+        ema_fast_period, ema_slow_period = self.periods[:2]
+        self.ema_fast, self.ema_slow = EMA(ema_fast_period), EMA(ema_slow_period)
+        self.macro_timestamp = None
+        self.macro_close = NAN
+
+    def reset_micro(self):
+        rsi_period, bb_length, volume_period = self.periods[2:]
+        self.rsi, self.bb, self.avg_volume = RSI(rsi_period), RollingStats(bb_length), RollingStats(volume_period)
+        self.micro_timestamp = None
+        self.price, self.volume = NAN, NAN
+
+    def feed_macro(self, timestamp, close, revise):
+        for indicator in (self.ema_fast, self.ema_slow):
+            indicator.revise(close) if revise else indicator.update(close)
+        self.macro_timestamp, self.macro_close = timestamp, close
+
+    def feed_micro(self, timestamp, close, volume, revise):
+        for indicator, value in ((self.rsi, close), (self.bb, close), (self.avg_volume, volume)):
+            indicator.revise(value) if revise else indicator.update(value)
+        self.micro_timestamp, self.price, self.volume = timestamp, close, volume
+
+def _new_rows(timestamps, last_timestamp):
+    # Indeks pierwszej świecy do przetworzenia lub None, jeśli ciągłość z poprzednią synchronizacją jest zerwana
+    if last_timestamp is None:
+        return 0
+    for i in range(len(timestamps) - 1, -1, -1):
+        ts = int(timestamps[i])
+        if ts == last_timestamp:
+            return i
+        if ts < last_timestamp:
+            break
+    return None
+
+class IndicatorEngine:
+    # Utrzymuje stan wskaźników dla każdego symbolu i aktualizuje go tylko o nowe lub zmienione świece
+    def __init__(self, ema_fast_period=EMA_FAST_PERIOD, ema_slow_period=EMA_SLOW_PERIOD, rsi_period=RSI_PERIOD,
+                 bb_length=BB_LENGTH, bb_std=BB_STD, volume_period=VOLUME_AVG_PERIOD):
+        self.periods = (ema_fast_period, ema_slow_period, rsi_period, bb_length, volume_period)
+        self.bb_std = bb_std
+        self.states = {}
+
+    def sync(self, symbol, macro_timestamps, macro_ohlcv, micro_timestamps, micro_ohlcv, bar_ms=None):
+        # *_timestamps: tablica czasów (ms), *_ohlcv: tablica (n, 5) open, high, low, close, volume.
+        # bar_ms: (długość świecy makro, długość świecy mikro) w ms - wtedy wartości po każdej nowej świecy mikro
+        # (z trendem makro z chwili jej zamknięcia) czekają na take_missed, żeby para analizowana rzadziej
+        # niż co świecę nie gubiła sygnałów z pominiętych świec
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = IndicatorState(*self.periods)
+
+        macro_start = _new_rows(macro_timestamps, state.macro_timestamp)
+        if macro_start is None:
+            state.reset_macro()
+            macro_start = 0
+        last_micro = state.micro_timestamp
+        start = _new_rows(micro_timestamps, state.micro_timestamp)
+        if start is None:
+            state.reset_micro()
+            start = 0
+        for i in range(start, len(micro_timestamps)):
+            ts = int(micro_timestamps[i])
+            if bar_ms:
+                macro_start = self._feed_macro(state, macro_timestamps, macro_ohlcv, macro_start, ts + bar_ms[1] - bar_ms[0])
+            state.feed_micro(ts, float(micro_ohlcv[i, 3]), float(micro_ohlcv[i, 4]), revise=ts == state.micro_timestamp)
+            if bar_ms and last_micro is not None and ts > last_micro:
+                state.pending.append((ts, self._values(state)))
+        self._feed_macro(state, macro_timestamps, macro_ohlcv, macro_start)
+        return state
+
+    def _feed_macro(self, state, timestamps, ohlcv, start, until=None):
+        # Świece makro od indeksu start o czasie otwarcia <= until (wszystkie, gdy until=None); zwraca kolejny indeks
+        i = start
+        while i < len(timestamps) and (until is None or int(timestamps[i]) <= until):
+            ts = int(timestamps[i])
+            state.feed_macro(ts, float(ohlcv[i, 3]), revise=ts == state.macro_timestamp)
+            i += 1
+        return i
+
+    def take_missed(self, symbol):
+        # Wartości po świecach zamkniętych przed najnowszą, które nie były jeszcze analizowane (od najstarszej)
+        state = self.states.get(symbol)
+        if state is None:
+            return []
+        missed = [values for ts, values in state.pending if ts < state.micro_timestamp]
+        state.pending.clear()
+        return missed
+
+    def snapshot(self, symbol):
+        # Najnowsze wartości wskaźników w formacie StrategyAnalyzer.compute_snapshot
+        state = self.states.get(symbol)
+        if state is None or state.micro_timestamp is None:
+            return None
+        return self._values(state)
+
+    def _values(self, state):
+        bb_mean, bb_std = state.bb.mean, state.bb.std
+        return {
+            'macro_close': state.macro_close, 'ema_fast': state.ema_fast.value, 'ema_slow': state.ema_slow.value,
+            'price': state.price, 'rsi': state.rsi.value, 'prev_rsi': state.rsi.prev_value,
+            'volume': state.volume, 'avg_volume': state.avg_volume.mean,
+            'bb_lower': bb_mean - bb_std * self.bb_std, 'bb_upper': bb_mean + bb_std * self.bb_std,
+            'timestamp': datetime.fromtimestamp(state.micro_timestamp / 1000, tz=timezone.utc).replace(tzinfo=None),
+        }
+
+    def retain(self, symbols):
+        symbols = set(symbols)
+        for symbol in [s for s in self.states if s not in symbols]:
+            del self.states[symbol]
+
+# Wersje wektorowe dla całej historii (backtest, przegląd wielu symboli). Przyjmują tablicę 1-D lub 2-D
+# (czas x symbole), liczą kolumny niezależnie i dopuszczają NaN na początku serii (krótsza historia symbolu).
+
+def _frame(values):
+    import pandas as pd
+    return pd.DataFrame(np.asarray(values, dtype=np.float64).reshape(len(values), -1))
+
+def _result(frame, values):
+    result = frame.to_numpy()
+    return result.reshape(np.shape(values))
+
+def ema_array(values, length):
+    frame = _frame(values)
+    counts = frame.notna().cumsum()
+    # Jak ta.ema: ziarno SMA z pierwszych `length` wartości każdej kolumny, potem ewm(adjust=False)
+    seeded = frame.where(counts > length)
+    seeded = seeded.mask(counts == length, frame.rolling(length).mean())
+    return _result(seeded.ewm(span=length, adjust=False).mean(), values)
+
+def rsi_array(values, length):
+    change = _frame(values).diff()
+    gain = change.clip(lower=0).ewm(alpha=1.0 / length, min_periods=length).mean()
+    loss = (-change).clip(lower=0).ewm(alpha=1.0 / length, min_periods=length).mean()
+    return _result(100.0 * gain / (gain + loss), values)
+
+def sma_array(values, length):
+    return _result(_frame(values).rolling(length).mean(), values)
+
+def std_array(values, length):
+    return _result(_frame(values).rolling(length).std(ddof=0), values)
+
+# Porównanie z pandas_ta na losowych danych (uruchom: python indicators.py)
+if __name__ == "__main__":
+    import pandas as pd
+    import pandas_ta as ta
+
+    rng = np.random.default_rng(0)
+    close = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, 1000))))
+    volume = pd.Series(rng.lognormal(10, 1, 1000))
+    expected = {
+        'ema': ta.ema(close, length=EMA_SLOW_PERIOD), 'rsi': ta.rsi(close, length=RSI_PERIOD),
+        'avg_volume': ta.sma(volume, length=VOLUME_AVG_PERIOD),
+        'bb_lower': ta.bbands(close, length=BB_LENGTH, std=BB_STD).iloc[:, 0],
+    }
+    ema, rsi, bb, avg_volume = EMA(EMA_SLOW_PERIOD), RSI(RSI_PERIOD), RollingStats(BB_LENGTH), RollingStats(VOLUME_AVG_PERIOD)
+    for i in range(len(close)):
+        # Każda świeca najpierw "formuje się" z inną ceną, a potem jest korygowana do ostatecznej
+        for indicator, value in ((ema, close[i]), (rsi, close[i]), (bb, close[i]), (avg_volume, volume[i])):
+            indicator.update(value * 1.01)
+            indicator.revise(value)
+        actual = {'ema': ema.value, 'rsi': rsi.value, 'avg_volume': avg_volume.mean, 'bb_lower': bb.mean - bb.std * BB_STD}
+        for name, series in expected.items():
+            if not pd.isna(series[i]):
+                assert abs(actual[name] - series[i]) <= 1e-9 * max(1.0, abs(series[i])), (name, i, actual[name], series[i])
+    vectorized = {
+        'ema': ema_array(close.to_numpy(), EMA_SLOW_PERIOD), 'rsi': rsi_array(close.to_numpy(), RSI_PERIOD),
+        'avg_volume': sma_array(volume.to_numpy(), VOLUME_AVG_PERIOD),
+        'bb_lower': sma_array(close.to_numpy(), BB_LENGTH) - std_array(close.to_numpy(), BB_LENGTH) * BB_STD,
+    }
+    for name, series in expected.items():
+        assert np.allclose(vectorized[name], series.to_numpy(), rtol=1e-9, equal_nan=True), name
+    print("Wskaźniki strumieniowe i wektorowe zgodne z pandas_ta.")
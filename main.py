@@ -1,85 +1,194 @@
 import asyncio
 import logging
-from exchange_client import ExchangeClient
+from datetime import timezone
+from exchange_router import ExchangeRouter
+from metrics import CYCLE_SECONDS, CYCLE_SYMBOLS, SIGNAL_LATENCY_SECONDS, monitor_event_loop_lag, start_metrics_server
+from candle_archive import CandleArchive
+from candle_store import CandleStore
+from scheduler import CandleScheduler, PollPriority
+from snapshot_cache import SnapshotCache
 from strategy_analyzer import StrategyAnalyzer
+from strategies import StrategyRegistry
 from telegram_bot import TelegramBot
-from utils import load_symbols
-from config import TIMEFRAME_MACRO, TIMEFRAME_MICRO, TELEGRAM_CHAT_ID
+from symbol_registry import SymbolRegistry
+from warm_state import WarmState
+from workers import AnalysisWorkers
+from config import (
+    TIMEFRAME_BASE, TIMEFRAME_MACRO, TIMEFRAME_MICRO, BASE_HISTORY_CANDLES, TELEGRAM_CHAT_ID,
+    CANDLE_CLOSE_GRACE_SECONDS, METRICS_HOST, METRICS_PORT, EVENT_LOOP_LAG_INTERVAL,
+    ANALYSIS_WORKERS, WARM_STATE_INTERVAL, CANDLE_ARCHIVE_DIR, RSI_OVERSOLD, RSI_OVERBOUGHT,
+    POLL_BUDGET_PER_CYCLE, POLL_MAX_INTERVAL, POLL_RSI_MARGIN, POLL_BB_MARGIN, STRATEGIES
+)
 
 # Ustawienia
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-async def analysis_loop(telegram_bot: TelegramBot):
+async def run_cycle(snapshot_cache, symbols, last_signals, send_signal, scheduler=None, per_second=None, workers=None,
+                    strategies=None):
+    # Jeden przebieg analizy wszystkich symboli (pobranie świec, wskaźniki, sygnały); używany też przez benchmark.py.
+    # workers: opcjonalne AnalysisWorkers - wskaźniki liczone są wtedy w procesach analizy, a sygnały wysyłane stąd.
+    # strategies: StrategyRegistry (domyślnie strategie z STRATEGIES); last_signals: {symbol: {strategia: typ}}.
+    # Zwraca {symbol: status} (None, gdy brak danych)
+    candle_store = snapshot_cache.candle_store
+    strategies = strategies or StrategyRegistry.from_config(snapshot_cache, STRATEGIES)
+    for symbol in symbols:
+        if not isinstance(last_signals.get(symbol), dict):
+            last_signals[symbol] = {}
+
+    # Z giełdy pobierany jest tylko interwał bazowy; makro i mikro są z niego wyliczane lokalnie.
+    # Zapytania startują naraz - tempo dla każdej giełdy osobno wyznacza jej budżet zapytań (rate_limiter.TokenBucket).
+    # Dane usuniętych par zwalniane są przy zmianie listy (forget_symbols), nie w każdym przebiegu
+    await candle_store.refresh_many(symbols, per_second=per_second)
+    results = await workers.analyze(symbols) if workers else None
+    statuses = {}
+
+    for symbol in symbols:
+        logging.debug(f"Analizowanie symbolu: {symbol}")
+        # Wskaźniki aktualizowane są tylko o nowe, zamknięte świece; status trafia do wspólnej pamięci dla bota
+        # missed: świece zamknięte od poprzedniej analizy pary, jeśli PollPriority ją pomijało - sygnały z nich
+        # nie przepadają, tylko są wysyłane z opóźnieniem
+        if workers:
+            status, snapshot, missed = results[symbol]
+            if status is not None:
+                snapshot_cache.record_status(symbol, status)
+        else:
+            status, snapshot = snapshot_cache.evaluate(symbol)
+            missed = snapshot_cache.indicator_engine.take_missed(symbol)
+        statuses[symbol] = status
+        if status is None:
+            logging.warning(f"Brak danych dla {symbol}, pomijam.")
+            continue
+        # Wszystkie strategie korzystają z tej samej migawki wskaźników (i innych węzłów liczonych raz na parę);
+        # świece sprawdzane są po kolei, od najstarszej
+        for context in strategies.contexts(symbol, snapshot, missed):
+            for signal in strategies.signals(context, last_signals[symbol]):
+                await send_signal(signal)
+                if scheduler:
+                    candle_open_ms = int(signal['timestamp'].replace(tzinfo=timezone.utc).timestamp() * 1000)
+                    latency = scheduler.record_signal(candle_open_ms, TIMEFRAME_MICRO)
+                    SIGNAL_LATENCY_SECONDS.observe(latency)
+                    logging.info(f"Sygnał {signal['type']} ({signal['strategy']}) dla {symbol} wysłany {latency:.1f}s po zamknięciu świecy.")
+    return statuses
+
+def forget_symbols(snapshot_cache, symbols, removed, last_signals, workers=None, poll_priority=None, strategies=None):
+    # Zwolnienie buforów, stanów wskaźników i statusów usuniętych par oraz nowy podział par między procesy analizy
+    for symbol in removed:
+        last_signals.pop(symbol, None)
+    if removed:
+        if poll_priority:
+            poll_priority.retain(symbols)
+        if strategies:
+            strategies.retain(symbols)
+        snapshot_cache.candle_store.retain(symbols)
+        snapshot_cache.indicator_engine.retain(symbols)
+        snapshot_cache.retain(symbols)
+    if workers:
+        moved = workers.shards.update(symbols)
+        if moved:
+            logging.info(f"Przeniesiono {len(moved)} symboli między procesami analizy.")
+
+async def analysis_loop(telegram_bot: TelegramBot, workers=None, last_signals=None):
+    # last_signals: ostatnie wysłane sygnały każdej pary i strategii (np. wczytane z zapisanego stanu)
     logging.info("Uruchamianie pętli analitycznej...")
-    exchange_client = telegram_bot.exchange_client
-    strategy_analyzer = StrategyAnalyzer()
-    last_signals = {}
+    snapshot_cache = telegram_bot.snapshot_cache
+    symbol_registry = telegram_bot.symbol_registry
+    scheduler = CandleScheduler([TIMEFRAME_MICRO, TIMEFRAME_MACRO], grace_seconds=CANDLE_CLOSE_GRACE_SECONDS)
+    last_signals = last_signals if last_signals is not None else {}
+    # Pary blisko sygnału odświeżane w każdym cyklu, pozostałe rzadziej - w stałym budżecie zapytań na cykl
+    poll_priority = PollPriority(RSI_OVERSOLD, RSI_OVERBOUGHT, budget=POLL_BUDGET_PER_CYCLE, max_interval=POLL_MAX_INTERVAL,
+                                 rsi_margin=POLL_RSI_MARGIN, bb_margin=POLL_BB_MARGIN)
+    strategies = StrategyRegistry.from_config(snapshot_cache, STRATEGIES)
+    symbol_registry.subscribe(lambda added, removed: forget_symbols(
+        snapshot_cache, symbol_registry.symbols(), removed, last_signals, workers, poll_priority, strategies))
 
     while True:
         try:
-            current_symbols = load_symbols()
+            # Lista z pamięci; plik czytany jest ponownie tylko po zmianie z zewnątrz
+            current_symbols = symbol_registry.symbols()
             if not current_symbols:
-                logging.warning("Brak symboli do monitorowania. Pętla analityczna czeka 60s.")
-                await asyncio.sleep(60)
+                logging.warning("Brak symboli do monitorowania. Pętla analityczna czeka na kolejną świecę.")
+                await scheduler.wait_for_close()
                 continue
 
-            for symbol in current_symbols:
-                if symbol not in last_signals:
-                    last_signals[symbol] = None
-
-            for symbol in current_symbols:
-                logging.info(f"Analizowanie symbolu: {symbol}")
-                df_macro = exchange_client.fetch_ohlcv(symbol, TIMEFRAME_MACRO, limit=300)
-                df_micro = exchange_client.fetch_ohlcv(symbol, TIMEFRAME_MICRO, limit=300)
-
-                if df_macro.empty or df_micro.empty:
-                    logging.warning(f"Brak danych dla {symbol}, pomijam.")
-                    continue
-                
-                df_macro, df_micro = df_macro.sort_index(), df_micro.sort_index()
-                signal = strategy_analyzer.analyze(df_macro, df_micro)
-
-                if signal:
-                    signal['symbol'] = symbol
-                    if last_signals.get(symbol) != signal['type']:
-                        await telegram_bot.send_signal(signal)
-                        last_signals[symbol] = signal['type']
-                else:
-                    last_signals[symbol] = None
-                
-                await asyncio.sleep(5)
-
-            # Prostsza logika oczekiwania - czekaj 1 minutę po pełnym cyklu
-            logging.info(f"Pętla analityczna zakończona. Następne uruchomienie za 60 sekund.")
-            await asyncio.sleep(60)
+            polled = poll_priority.select(current_symbols)
+            with CYCLE_SECONDS.time():
+                statuses = await run_cycle(snapshot_cache, polled, last_signals, telegram_bot.send_signal, scheduler,
+                                           workers=workers, strategies=strategies)
+            poll_priority.record(statuses)
+            CYCLE_SYMBOLS.set(len(polled))
+            logging.debug(f"Odświeżono {len(polled)} z {len(current_symbols)} par.")
+            scheduler.record_cycle()
+            scheduler.log_latency()
+            await scheduler.wait_for_close()
 
         except Exception as e:
             logging.error(f"Wystąpił błąd w pętli analitycznej: {e}", exc_info=True)
             await asyncio.sleep(60)
 
 async def main():
-    exchange_client = ExchangeClient()
-    telegram_bot = TelegramBot(exchange_client=exchange_client, chat_id=TELEGRAM_CHAT_ID)
+    # Klient każdej giełdy tworzony jest przy pierwszym symbolu z tej giełdy
+    exchange_client = ExchangeRouter()
+    archive = CandleArchive(CANDLE_ARCHIVE_DIR) if CANDLE_ARCHIVE_DIR else None
+    candle_store = CandleStore(exchange_client, TIMEFRAME_BASE, capacity=BASE_HISTORY_CANDLES, shared=ANALYSIS_WORKERS > 0,
+                               archive=archive)
+    strategy_analyzer = StrategyAnalyzer()
+    snapshot_cache = SnapshotCache(candle_store, strategy_analyzer, strategy_analyzer.create_engine())
+    # Tryb wieloprocesowy: obliczenia wskaźników w procesach analizy, pobieranie i Telegram w tym procesie
+    workers = AnalysisWorkers(candle_store, strategy_analyzer, ANALYSIS_WORKERS, TIMEFRAME_MACRO, TIMEFRAME_MICRO) \
+        if ANALYSIS_WORKERS > 0 else None
+    symbol_registry = SymbolRegistry().load()
+    telegram_bot = TelegramBot(exchange_client=exchange_client, chat_id=TELEGRAM_CHAT_ID, snapshot_cache=snapshot_cache,
+                               symbol_registry=symbol_registry)
+    # Szybki start: świece, rynki i ostatnie sygnały z zapisanego stanu - pierwszy cykl pobiera tylko nowe świece
+    warm_state = WarmState() if WARM_STATE_INTERVAL > 0 else None
+    last_signals = {}
+    if warm_state:
+        warm_state.restore(candle_store, exchange_client, last_signals, symbol_registry.symbols())
 
-    # Uruchomienie aplikacji bota i pętli analitycznej w jednej pętli zdarzeń
-    async with telegram_bot.app:
-        await telegram_bot.app.initialize()
-        await telegram_bot.app.start()
+    try:
+        # Uruchomienie aplikacji bota i pętli analitycznej w jednej pętli zdarzeń
+        async with telegram_bot.app:
+            await telegram_bot.app.initialize()
+            await telegram_bot.app.start()
         
-        # Uruchomienie nasłuchiwania w tle
-        if telegram_bot.app.updater:
-            await telegram_bot.app.updater.start_polling()
+            # Uruchomienie nasłuchiwania w tle
+            if telegram_bot.app.updater:
+                await telegram_bot.app.updater.start_polling()
+
+            # Metryki (Prometheus) i pomiar opóźnienia pętli zdarzeń
+            telegram_bot.sender.start()
+            metrics_server = await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+            lag_task = asyncio.create_task(monitor_event_loop_lag(EVENT_LOOP_LAG_INTERVAL))
 
-        # Uruchomienie pętli analitycznej
-        analysis_task = asyncio.create_task(analysis_loop(telegram_bot))
+            # Odświeżanie listy rynków w tle i uruchomienie pętli analitycznej
+            exchange_client.start_market_refresh()
+            analysis_task = asyncio.create_task(analysis_loop(telegram_bot, workers, last_signals))
+            save_task = asyncio.create_task(warm_state.run(candle_store, exchange_client, last_signals, WARM_STATE_INTERVAL)) \
+                if warm_state else None
 
-        # Oczekiwanie na zakończenie pętli analitycznej (nigdy się nie zakończy, chyba że wystąpi błąd)
-        await analysis_task
+            # Oczekiwanie na zakończenie pętli analitycznej (nigdy się nie zakończy, chyba że wystąpi błąd)
+            await analysis_task
+            lag_task.cancel()
+            if save_task:
+                save_task.cancel()
+            if metrics_server:
+                metrics_server.close()
         
-        # Zatrzymanie nasłuchiwania
-        if telegram_bot.app.updater:
-            await telegram_bot.app.updater.stop()
-        await telegram_bot.app.stop()
+            # Zatrzymanie nasłuchiwania i wysłanie zaległych wiadomości
+            if telegram_bot.app.updater:
+                await telegram_bot.app.updater.stop()
+            await telegram_bot.shutdown()
+            await telegram_bot.app.stop()
+    finally:
+        if warm_state:
+            try:
+                warm_state.save(candle_store, exchange_client, last_signals)
+            except Exception as e:
+                logging.error(f"Błąd zapisu stanu przy zamykaniu: {e}")
+        if workers:
+            workers.close()
+        candle_store.close()
+        await exchange_client.close()
 
 if __name__ == "__main__":
     try:
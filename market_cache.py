@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from metrics import MARKET_RELOADS
+
+class MarketCache:
+    # Pamięć podręczna metadanych rynków giełdy z czasem życia (TTL) i odświeżaniem w tle.
+    # Walidacja symbolu/interwału to sprawdzenie w zbiorze - bez zapytań do giełdy.
+    def __init__(self, exchange, ttl, min_reload_interval, exchange_id=''):
+        self.exchange = exchange
+        self.ttl = ttl
+        self.min_reload_interval = min_reload_interval
+        self.symbols = frozenset()
+        self.timeframes = frozenset()
+        self.loaded_at = 0.0
+        self.reload_count = 0  # Liczba pełnych przeładowań listy rynków
+        self.reloads = MARKET_RELOADS.labels(exchange_id)  # To samo w metrykach (bot_market_reloads_total)
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    @property
+    def age(self):
+        return time.monotonic() - self.loaded_at if self.loaded_at else float('inf')
+
+    def is_loaded(self):
+        return bool(self.symbols)
+
+    def restore(self, symbols, timeframes, age):
+        # Lista rynków z zapisanego stanu (warm_state.py); age - ile sekund temu została pobrana
+        self.symbols = frozenset(symbols)
+        self.timeframes = frozenset(timeframes)
+        self.loaded_at = time.monotonic() - age
+
+    def invalidate(self):
+        # Wymusza przeładowanie przy najbliższym użyciu
+        self.loaded_at = 0.0
+
+    async def refresh(self, loader):
+        # loader: korutyna pobierająca rynki (np. z ponawianiem po stronie ExchangeClient).
+        # Równoczesne wywołania czekają na jedno przeładowanie zamiast pobierać listę kilka razy.
+        loaded_at = self.loaded_at
+        async with self._lock:
+            if self.loaded_at != loaded_at and self.is_loaded():
+                return
+            await loader()
+            self.symbols = frozenset(self.exchange.symbols or [])
+            self.timeframes = frozenset(self.exchange.timeframes or {})
+            self.loaded_at = time.monotonic()
+            self.reload_count += 1
+            self.reloads.inc()
+            logging.info(f"Przeładowano listę rynków ({len(self.symbols)} symboli), przeładowanie nr {self.reload_count}.")
+
+    async def ensure_loaded(self, loader):
+        if not self.is_loaded() or self.age > self.ttl:
+            await self.refresh(loader)
+
+    async def has_symbol(self, symbol, loader):
+        # Nieznany symbol może oznaczać nowy rynek - przeładowujemy wtedy listę, ale nie częściej niż co min_reload_interval
+        await self.ensure_loaded(loader)
+        if symbol not in self.symbols and self.age > self.min_reload_interval:
+            await self.refresh(loader)
+        return symbol in self.symbols
+
+    def start_background_refresh(self, loader):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop(loader))
+        return self._refresh_task
+
+    async def stop_background_refresh(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _refresh_loop(self, loader):
+        while True:
+            await asyncio.sleep(max(self.ttl - self.age, 0) if self.is_loaded() else 0)
+            try:
+                await self.refresh(loader)
+            except Exception as e:
+                logging.error(f"Błąd odświeżania listy rynków w tle: {e}")
+                await asyncio.sleep(60)
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+from metrics import MESSAGE_QUEUE_DEPTH, MESSAGES
+from rate_limiter import TokenBucket
+
+OUTBOX_FILE = 'outbox.json'
+
+class MessageSender:
+    # Kolejka wiadomości wychodzących do Telegrama. Wysyłanie nie blokuje nadawcy (send tylko dodaje do kolejki),
+    # a kolejne wiadomości wychodzą z zachowaniem limitów Telegrama: globalnego (wiadomości/s dla całego bota)
+    # i dla każdego czatu osobno (grupy mają ostrzejszy limit). Każdy czat ma własną kolejkę FIFO, więc
+    # oczekiwanie jednego czatu (np. po RetryAfter) nie wstrzymuje pozostałych.
+    # Niewysłane wiadomości zapisywane są w outbox_path i wysyłane po ponownym uruchomieniu.
+    def __init__(self, bot, global_rate, chat_interval, group_interval, retries=3, workers=8, on_blocked=None,
+                 outbox_path=None, save_interval=1.0):
+        self.bot = bot
+        self.bucket = TokenBucket(global_rate)
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self.retries = retries
+        self.workers = workers
+        self.on_blocked = on_blocked  # Wywoływane z chat_id, gdy użytkownik zablokował bota
+        self.pending = {}  # chat_id -> deque[(text, kwargs, attempt)]
+        self.next_allowed = {}  # chat_id -> czas (monotonic), od którego można wysłać kolejną wiadomość
+        self.scheduled = set()
+        self.ready = asyncio.Queue()
+        self.size = 0
+        self.in_flight = {}  # chat_id -> wiadomość w trakcie wysyłania (zapisywana razem z kolejką)
+        self.outbox_path = outbox_path
+        self.save_interval = save_interval
+        self._dirty = False
+        self._tasks = []
+
+    def send(self, chat_id, text, **kwargs):
+        chat_id = str(chat_id)
+        self.pending.setdefault(chat_id, deque()).append((text, kwargs, 1))
+        self.size += 1
+        self._dirty = True
+        MESSAGE_QUEUE_DEPTH.set(self.size)
+        self._schedule(chat_id)
+
+    # --- Trwałość kolejki ---
+
+    def _snapshot(self):
+        messages = []
+        for chat_id in set(self.pending) | set(self.in_flight):
+            queued = ([self.in_flight[chat_id]] if chat_id in self.in_flight else []) + list(self.pending.get(chat_id, ()))
+            messages.extend({'chat_id': chat_id, 'text': text, 'kwargs': kwargs} for text, kwargs, _ in queued)
+        return messages
+
+    def save_outbox(self):
+        if not self.outbox_path:
+            return
+        tmp_path = self.outbox_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'messages': self._snapshot()}, f)
+        os.replace(tmp_path, self.outbox_path)
+        self._dirty = False
+
+    def load_outbox(self):
+        if not self.outbox_path:
+            return 0
+        try:
+            with open(self.outbox_path, 'r') as f:
+                messages = json.load(f).get('messages', [])
+        except FileNotFoundError:
+            return 0
+        except ValueError as e:
+            logging.error(f"Uszkodzony plik kolejki wiadomości {self.outbox_path}: {e}")
+            return 0
+        for message in messages:
+            self.send(message['chat_id'], message['text'], **message.get('kwargs', {}))
+        if messages:
+            logging.info(f"Wznowiono wysyłkę {len(messages)} zaległych wiadomości.")
+        return len(messages)
+
+    async def _save_loop(self):
+        # Zapis zbiorczy zamiast przy każdej wiadomości - najwyżej raz na save_interval sekund
+        while True:
+            await asyncio.sleep(self.save_interval)
+            if self._dirty:
+                try:
+                    self.save_outbox()
+                except OSError as e:
+                    logging.error(f"Błąd zapisu kolejki wiadomości: {e}")
+
+    def _schedule(self, chat_id):
+        if chat_id in self.scheduled or not self.pending.get(chat_id):
+            return
+        self.scheduled.add(chat_id)
+        delay = self.next_allowed.get(chat_id, 0.0) - time.monotonic()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self.ready.put_nowait, chat_id)
+        else:
+            self.ready.put_nowait(chat_id)
+
+    def _interval(self, chat_id):
+        return self.group_interval if chat_id.startswith('-') else self.chat_interval
+
+    async def _worker(self):
+        while True:
+            chat_id = await self.ready.get()
+            queue = self.pending[chat_id]
+            text, kwargs, attempt = self.in_flight[chat_id] = queue.popleft()
+            delay = self._interval(chat_id)
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                MESSAGES.labels('sent').inc()
+                self.size -= 1
+            except RetryAfter as e:
+                # Telegram podaje, ile trzeba odczekać; wiadomość wraca na początek kolejki czatu
+                retry_after = e.retry_after
+                delay = max(delay, retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after))
+                queue.appendleft((text, kwargs, attempt))
+                MESSAGES.labels('retry_after').inc()
+                logging.warning(f"Limit Telegrama dla czatu {chat_id}, ponowienie za {delay:.1f}s.")
+            except Forbidden:
+                # Bot zablokowany lub usunięty z czatu - pozostałe wiadomości do tego czatu są porzucane
+                MESSAGES.labels('forbidden').inc()
+                self.size -= len(queue) + 1
+                queue.clear()
+                logging.warning(f"Brak dostępu do czatu {chat_id}, porzucam jego wiadomości.")
+                if self.on_blocked:
+                    self.on_blocked(chat_id)
+            except BadRequest as e:
+                MESSAGES.labels('failed').inc()
+                self.size -= 1
+                logging.error(f"Odrzucona wiadomość do czatu {chat_id}: {e}")
+            except (TimedOut, NetworkError) as e:
+                if attempt < self.retries:
+                    queue.appendleft((text, kwargs, attempt + 1))
+                    delay = max(delay, 2.0 ** attempt)
+                    MESSAGES.labels('retry').inc()
+                else:
+                    MESSAGES.labels('failed').inc()
+                    self.size -= 1
+                    logging.error(f"Nie udało się wysłać wiadomości do czatu {chat_id} po {attempt} próbach: {e}")
+            except asyncio.CancelledError:
+                # Zatrzymanie w trakcie wysyłki - wiadomość zostaje w kolejce (i w zapisanym pliku)
+                queue.appendleft((text, kwargs, attempt))
+                raise
+            except Exception as e:
+                MESSAGES.labels('failed').inc()
+                self.size -= 1
+                logging.error(f"Nieoczekiwany błąd wysyłania do czatu {chat_id}: {e}", exc_info=True)
+            finally:
+                del self.in_flight[chat_id]
+                self._dirty = True
+                MESSAGE_QUEUE_DEPTH.set(self.size)
+                self.next_allowed[chat_id] = time.monotonic() + delay
+                self.scheduled.discard(chat_id)
+                if queue:
+                    self._schedule(chat_id)
+                else:
+                    del self.pending[chat_id]
+
+    def start(self):
+        if not self._tasks:
+            self.load_outbox()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._save_loop()))
+
+    async def stop(self, timeout=10.0):
+        # Czeka (do `timeout` sekund) na opróżnienie kolejki, potem zatrzymuje wysyłanie
+        deadline = time.monotonic() + timeout
+        while self.size > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.save_outbox()
+
+class Coalescer:
+    # Zbiera elementy dla klucza (np. czatu) przez `window` sekund od pierwszego z nich
+    # i przekazuje je razem do flush(key, items) - np. wiele sygnałów z jednego cyklu jako jedna wiadomość
+    def __init__(self, window, flush):
+        self.window = window
+        self.flush = flush
+        self.pending = {}
+
+    def add(self, key, item):
+        items = self.pending.get(key)
+        if items is None:
+            items = self.pending[key] = []
+            if self.window > 0:
+                asyncio.get_running_loop().call_later(self.window, self._flush, key)
+        items.append(item)
+        if self.window <= 0:
+            self._flush(key)
+
+    def _flush(self, key):
+        items = self.pending.pop(key, None)
+        if items:
+            self.flush(key, items)
+
+    def flush_all(self):
+        for key in list(self.pending):
+            self._flush(key)
+
+class ProgressMessage:
+    # Postęp długiej operacji w jednej wiadomości: edycje nie częściej niż co `interval` sekund,
+    # a wysyłany jest zawsze tylko najnowszy tekst (pośrednie stany są pomijane)
+    def __init__(self, query, interval):
+        self.query = query
+        self.interval = interval
+        self.text = None
+        self.sent_text = None
+        self._last_edit = 0.0
+        self._task = None
+
+    def update(self, text):
+        self.text = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        while self.text != self.sent_text:
+            delay = self._last_edit + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text = self.text
+            try:
+                await self.query.edit_message_text(text)
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                await asyncio.sleep(retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after))
+                continue
+            except (BadRequest, NetworkError) as e:
+                logging.debug(f"Pominięto aktualizację postępu: {e}")
+            self.sent_text = text
+            self._last_edit = time.monotonic()
+
+    async def finish(self, text, **kwargs):
+        # Ostatnia edycja (wynik) - zawsze wysyłana, po anulowaniu oczekujących aktualizacji postępu
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        delay = self._last_edit + self.interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.query.edit_message_text(text, **kwargs)
@@ -0,0 +1,250 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+
+# Lekka instrumentacja bez zależności: liczniki, wskaźniki (gauge) i histogramy w pamięci procesu,
+# udostępniane lokalnie przez HTTP w formacie tekstowym Prometheusa. Pomiar na gorącej ścieżce to
+# perf_counter i kilka operacji na liczbach - bez blokad i bez alokacji.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_text(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.children = {}
+        if not self.label_names:
+            self.children[()] = self._new_child()
+
+    def labels(self, *values):
+        # Wartości etykiet w kolejności z definicji; dziecko warto zapamiętać poza gorącą ścieżką
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        self.children.pop(values, None)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1.0):
+        self.children[()].inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_label_text(self.label_names, values)} {_number(child.value)}"]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value):
+        self.children[()].set(value)
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+class _Timer:
+    __slots__ = ('target', 'started')
+
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.target.observe(time.perf_counter() - self.started)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labels)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def time(self):
+        return self.children[()].time()
+
+    def _render_child(self, values, child):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_label_text(self.label_names, values, le)} {cumulative}")
+        labels = _label_text(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metryka {metric.name} jest już zarejestrowana.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+# --- Metryki bota ---
+
+FETCH_SECONDS = REGISTRY.histogram('bot_fetch_ohlcv_seconds', "Czas pobierania świec z giełdy (z ponowieniami).")
+FETCH_RESULTS = REGISTRY.counter('bot_fetch_ohlcv_total', "Zapytania o świece według giełdy i wyniku.", ('exchange', 'result'))
+FETCH_CANDLES = REGISTRY.counter('bot_fetch_ohlcv_candles_total', "Liczba pobranych świec.")
+MARKET_RELOADS = REGISTRY.counter('bot_market_reloads_total', "Pełne przeładowania listy rynków według giełdy.", ('exchange',))
+SYMBOL_LAST_SUCCESS = REGISTRY.gauge('bot_symbol_last_success_timestamp_seconds',
+                                     "Czas (unix) ostatniego udanego pobrania świec symbolu.", ('symbol',))
+ANALYSIS_SECONDS = REGISTRY.histogram('bot_analysis_seconds', "Czas metod StrategyAnalyzer.", ('method',),
+                                      buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+SIGNAL_SEND_SECONDS = REGISTRY.histogram('bot_send_signal_seconds', "Czas przekazania sygnału do wysyłki (wyszukanie odbiorców i kolejka).")
+SIGNALS_SENT = REGISTRY.counter('bot_signals_sent_total', "Wysłane sygnały według typu.", ('type',))
+MESSAGES = REGISTRY.counter('bot_telegram_messages_total', "Wiadomości wychodzące według wyniku wysyłki.", ('result',))
+MESSAGE_QUEUE_DEPTH = REGISTRY.gauge('bot_telegram_queue_depth', "Liczba wiadomości czekających w kolejce wysyłki.")
+CYCLE_SECONDS = REGISTRY.histogram('bot_analysis_cycle_seconds', "Czas pełnego cyklu pętli analitycznej.",
+                                   buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+SIGNAL_LATENCY_SECONDS = REGISTRY.histogram('bot_signal_latency_seconds', "Czas od zamknięcia świecy do wysłania sygnału.",
+                                           buckets=(1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0))
+CYCLE_SYMBOLS = REGISTRY.gauge('bot_analysis_cycle_symbols', "Liczba symboli w ostatnim cyklu.")
+LOOP_LAG_SECONDS = REGISTRY.histogram('bot_event_loop_lag_seconds', "Opóźnienie pętli zdarzeń asyncio.",
+                                      buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+LOOP_LAG_MAX = REGISTRY.gauge('bot_event_loop_lag_max_seconds', "Największe opóźnienie pętli zdarzeń od ostatniego odczytu metryk.")
+
+def timed(histogram_child):
+    # Dekorator mierzący czas wywołania funkcji (zwykłej lub async) do podanego histogramu
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram_child.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram_child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+async def monitor_event_loop_lag(interval=0.5):
+    # Zadanie w tle: różnica między zaplanowanym a faktycznym wybudzeniem to czas, przez który
+    # pętla zdarzeń była zajęta (np. obliczeniami wskaźników) i nie obsługiwała innych zadań
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - expected, 0.0)
+        LOOP_LAG_SECONDS.observe(lag)
+        if lag > LOOP_LAG_MAX.children[()].value:
+            LOOP_LAG_MAX.set(lag)
+
+async def _handle_request(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] in ('/', '/metrics'):
+            body, status = REGISTRY.render().encode('utf-8'), '200 OK'
+            LOOP_LAG_MAX.set(0.0)
+        else:
+            body, status = b'Not Found\n', '404 Not Found'
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(host, port):
+    # Punkt końcowy /metrics dla Prometheusa; domyślnie nasłuchuje tylko lokalnie
+    server = await asyncio.start_server(_handle_request, host, port)
+    logging.info(f"Metryki dostępne pod http://{host}:{port}/metrics")
+    return server
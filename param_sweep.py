@@ -0,0 +1,159 @@
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from config import TIMEFRAME_MICRO
+from backtester import (
+    IndicatorCache, compute_indicators, generate_signals, trade_returns, summarize,
+    discover_symbols, find_candle_file, load_symbol_data
+)
+from shared_series import share_series, attach_series
+from strategy_analyzer import DEFAULT_PARAMS, INDICATOR_PARAMS
+from symbol_registry import SymbolRegistry
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Przegląd parametrów strategii: kombinacje rozdzielane są na pulę procesów, świece trafiają do procesów
+# przez pamięć współdzieloną (bez kopiowania), a serie wskaźników są liczone raz dla wielu kombinacji.
+
+DEFAULT_GRID = {
+    'ema_fast_period': [20, 50, 100],
+    'ema_slow_period': [100, 200],
+    'rsi_period': [7, 14, 21],
+    'rsi_oversold': [20, 25, 30, 35],
+    'rsi_overbought': [65, 70, 75, 80],
+    'bb_length': [20, 30],
+    'bb_std': [2.0, 2.5],
+    'volume_multiplier': [1.0, 1.5, 2.0],
+}
+
+def build_combinations(grid, samples=None, seed=None):
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    combos = [c for c in combos if c.get('ema_fast_period', 0) < c.get('ema_slow_period', float('inf'))]
+    if samples is not None and samples < len(combos):
+        combos = random.Random(seed).sample(combos, samples)
+    # Kombinacje o tych samych parametrach wskaźników trafiają obok siebie (i do tych samych zadań),
+    # więc różnią się tylko progami i korzystają z tej samej pamięci podręcznej serii
+    return sorted(combos, key=lambda c: tuple(c.get(k, DEFAULT_PARAMS[k]) for k in INDICATOR_PARAMS))
+
+# --- Proces roboczy ---
+
+_worker = {}
+
+def _init_worker(layout, hold_bars, fee, cache_size):
+    segments, data = [], {}
+    for symbol, series in layout.items():
+        micro_shm, micro = attach_series(*series['micro'])
+        macro_shm, macro = attach_series(*series['macro'])
+        segments += [micro_shm, macro_shm]
+        data[symbol] = (micro, macro)
+    _worker.update(segments=segments, data=data, hold_bars=hold_bars, fee=fee, cache=IndicatorCache(cache_size))
+
+def _evaluate_chunk(combos):
+    # Pary w pętli zewnętrznej: pamięć podręczna trzyma wtedy serie jednej pary naraz, więc jej rozmiar
+    # nie zależy od liczby par, a kombinacje różniące się progami zawsze trafiają na policzone już serie
+    cache = _worker['cache']
+    params = [{**DEFAULT_PARAMS, **combo} for combo in combos]
+    returns = [[] for _ in combos]
+    for symbol, (micro, macro) in _worker['data'].items():
+        for i, combo_params in enumerate(params):
+            ind = compute_indicators(micro, macro, combo_params, cache=cache, key=symbol)
+            buy, sell = generate_signals(ind, combo_params)
+            returns[i].append(trade_returns(ind['price'], buy, sell, _worker['hold_bars'], _worker['fee'])[2])
+    return [{**combo, **summarize(np.concatenate(combo_returns) if combo_returns else np.array([]))}
+            for combo, combo_returns in zip(combos, returns)]
+
+# --- Koordynator ---
+
+def run_sweep(data, combos, workers=None, hold_bars=24, fee=0.001, chunk_size=32, cache_size=512):
+    # data: {symbol: (micro, macro)}, gdzie micro/macro to (timestamps, ohlcv) jak z backtester.load_candles
+    segments, layout = [], {}
+    try:
+        for symbol, (micro, macro) in data.items():
+            micro_shm, micro_ref = share_series(*micro)
+            macro_shm, macro_ref = share_series(*macro)
+            segments += [micro_shm, macro_shm]
+            layout[symbol] = {'micro': micro_ref, 'macro': macro_ref}
+
+        chunks = [combos[i:i + chunk_size] for i in range(0, len(combos), chunk_size)]
+        rows = []
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(layout, hold_bars, fee, cache_size)) as executor:
+            futures = [executor.submit(_evaluate_chunk, chunk) for chunk in chunks]
+            for done, future in enumerate(as_completed(futures), 1):
+                rows.extend(future.result())
+                if done % max(1, len(chunks) // 10) == 0:
+                    logging.info(f"Przegląd parametrów: {done}/{len(chunks)} paczek.")
+        return rows
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+
+def rank_results(rows, metric='total_return', min_trades=1):
+    rows = [r for r in rows if r['trades'] >= min_trades]
+    return sorted(rows, key=lambda r: r[metric], reverse=True)
+
+def write_results(rows, path):
+    if not rows:
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['rank'] + list(rows[0]))
+        writer.writeheader()
+        for rank, row in enumerate(rows, 1):
+            writer.writerow({'rank': rank, **row})
+
+def load_data(data_dir, symbols):
+    data = {}
+    for symbol in symbols:
+        series = load_symbol_data(data_dir, symbol)
+        if series is not None:
+            data[symbol] = series
+        else:
+            logging.warning(f"Brak pliku świec {TIMEFRAME_MICRO} dla {symbol}, pomijam.")
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description="Równoległy przegląd parametrów strategii na lokalnych plikach świec.")
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--symbols', nargs='*', help="Pary (domyślnie monitorowane pary, dla których są pliki)")
+    parser.add_argument('--grid', help="Plik JSON z siatką {parametr: [wartości]} (domyślnie DEFAULT_GRID)")
+    parser.add_argument('--random', type=int, help="Losowa próbka N kombinacji zamiast pełnej siatki")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--workers', type=int, help="Liczba procesów (domyślnie liczba rdzeni)")
+    parser.add_argument('--hold', type=int, default=24)
+    parser.add_argument('--fee', type=float, default=0.001)
+    parser.add_argument('--rank-by', default='total_return',
+                        choices=['total_return', 'avg_return', 'win_rate', 'profit_factor', 'trades'])
+    parser.add_argument('--min-trades', type=int, default=10)
+    parser.add_argument('--output', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    symbols = args.symbols or [s for s in SymbolRegistry().load().symbols() if find_candle_file(args.data_dir, s, TIMEFRAME_MICRO)] \
+        or discover_symbols(args.data_dir)
+    data = load_data(args.data_dir, symbols)
+    combos = build_combinations(grid, args.random, args.seed)
+    logging.info(f"Przegląd {len(combos)} kombinacji dla {len(data)} par.")
+
+    started = time.perf_counter()
+    rows = run_sweep(data, combos, args.workers, args.hold, args.fee)
+    ranked = rank_results(rows, args.rank_by, args.min_trades)
+    write_results(ranked, args.output)
+    logging.info(f"Zakończono w {time.perf_counter() - started:.1f}s, wyniki zapisano do {args.output}.")
+    for rank, row in enumerate(ranked[:10], 1):
+        params = ', '.join(f"{k}={row[k]}" for k in grid)
+        print(f"{rank}. {args.rank_by}={row[args.rank_by]:.4f} transakcje={row['trades']} | {params}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+class TokenBucket:
+    # Budżet zapytań giełdy: `rate` jednostek wagi na sekundę z zapasem `capacity` na chwilowe skoki.
+    # Zapytania czekają w kolejności zgłoszenia, aż uzbiera się ich waga.
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self.waited = 0.0  # Łączny czas oczekiwania na budżet (sekundy)
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight=1):
+        weight = min(weight, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                delay = (weight - self.tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        # Po odpowiedzi "za dużo zapytań" (HTTP 429) wstrzymuje wszystkie zapytania do tej giełdy na `seconds`
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
@@ -0,0 +1,105 @@
+import asyncio
+import random
+import time
+import ccxt
+import numpy as np
+from backtester import find_candle_file, load_candles
+from resampler import resample_ohlcv
+from utils import timeframe_to_seconds
+
+# Lokalne źródło świec o interfejsie giełdy ccxt (load_markets, fetch_ohlcv, symbols, timeframes, close),
+# do podstawienia w ExchangeClient zamiast prawdziwej giełdy - testy i pomiary bez zapytań do Binance.
+# Opcjonalnie symuluje opóźnienie sieci, błędy i odpowiedzi o przekroczeniu limitu zapytań.
+
+def random_walk_ohlcv(candles, timeframe, end_ms=None, start_price=100.0, volatility=0.01, seed=None):
+    # Syntetyczna seria (timestamps, ohlcv) kończąca się na bieżącej, formującej się świecy
+    rng = np.random.default_rng(seed)
+    timeframe_ms = timeframe_to_seconds(timeframe) * 1000
+    end_ms = end_ms if end_ms is not None else int(time.time() * 1000)
+    timestamps = (end_ms // timeframe_ms - np.arange(candles)[::-1]) * timeframe_ms
+    close = start_price * np.exp(np.cumsum(rng.normal(0, volatility, candles)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, volatility, candles))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, volatility, candles))
+    volume = rng.lognormal(10, 1, candles)
+    return timestamps.astype(np.int64), np.column_stack([open_, high, low, close, volume])
+
+class ReplaySource:
+    id = 'replay'
+
+    def __init__(self, timeframe, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=None):
+        # latency/jitter: opóźnienie każdego zapytania w sekundach (stałe + losowe do `jitter`);
+        # error_rate/rate_limit_rate: prawdopodobieństwo błędu sieci / odpowiedzi 429 na zapytanie
+        self.timeframe = timeframe
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.series = {}
+        self.symbols = []
+        self.timeframes = {timeframe: timeframe}
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+
+    def add_series(self, symbol, timestamps, ohlcv):
+        if symbol not in self.series:
+            self.symbols.append(symbol)
+        self.series[symbol] = (np.asarray(timestamps, dtype=np.int64), np.asarray(ohlcv, dtype=np.float64))
+
+    def add_random_walks(self, symbols, candles, seed=None, end_ms=None):
+        end_ms = end_ms if end_ms is not None else int(time.time() * 1000)
+        for i, symbol in enumerate(symbols):
+            walk_seed = None if seed is None else seed + i
+            self.add_series(symbol, *random_walk_ohlcv(candles, self.timeframe, end_ms, seed=walk_seed))
+        return self
+
+    def add_files(self, data_dir, symbols, shift_to_now=True):
+        # Pliki świec w formacie backtestera (CSV/Parquet); zwraca symbole, dla których znaleziono plik.
+        # shift_to_now: przesuwa historię tak, aby ostatnia świeca była bieżącą (CandleStore pobiera świece od "teraz")
+        timeframe_ms = timeframe_to_seconds(self.timeframe) * 1000
+        current_open = int(time.time() * 1000) // timeframe_ms * timeframe_ms
+        loaded = []
+        for symbol in symbols:
+            path = find_candle_file(data_dir, symbol, self.timeframe)
+            if path:
+                timestamps, ohlcv = load_candles(path)
+                if shift_to_now and len(timestamps):
+                    timestamps = timestamps + (current_open - timestamps[-1])
+                self.add_series(symbol, timestamps, ohlcv)
+                loaded.append(symbol)
+        return loaded
+
+    async def _simulate_request(self):
+        self.requests += 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            self.failures += 1
+            raise ccxt.RateLimitExceeded(f"{self.id} 429 Too Many Requests (symulacja)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.failures += 1
+            raise ccxt.NetworkError(f"{self.id} symulowany błąd sieci")
+
+    async def load_markets(self, reload=False):
+        await self._simulate_request()
+        return {symbol: {'symbol': symbol} for symbol in self.symbols}
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=100):
+        await self._simulate_request()
+        if symbol not in self.series:
+            raise ccxt.BadSymbol(f"{self.id} nie zna symbolu {symbol}")
+        timestamps, ohlcv = self.series[symbol]
+        if timeframe != self.timeframe:
+            timestamps, ohlcv = resample_ohlcv(timestamps, ohlcv, self.timeframe, timeframe)
+        if since is not None:
+            start = int(np.searchsorted(timestamps, since))
+        else:
+            start = max(len(timestamps) - limit, 0)
+        end = min(start + limit, len(timestamps))
+        return [[int(ts), *values] for ts, values in zip(timestamps[start:end], ohlcv[start:end].tolist())]
+
+    async def close(self):
+        pass
@@ -0,0 +1,35 @@
+import numpy as np
+from utils import timeframe_to_seconds, timeframe_offset_seconds
+
+def resample_ohlcv(timestamps, ohlcv, base_timeframe, target_timeframe):
+    # Buduje świece wyższego interwału z serii bazowej (np. 4h z 1h), z granicami zgodnymi z giełdą:
+    # open - pierwsza świeca, high/low - maksimum/minimum, close - ostatnia, volume - suma.
+    # Niepełny koszyk na początku historii jest pomijany (zafałszowałby open/high/low), a niepełny koszyk
+    # na końcu zostaje jako bieżąca, formująca się świeca - tak jak zwraca ją giełda.
+    base_ms = timeframe_to_seconds(base_timeframe) * 1000
+    target_ms = timeframe_to_seconds(target_timeframe) * 1000
+    if target_ms % base_ms:
+        raise ValueError(f"Interwał {target_timeframe} nie jest wielokrotnością interwału bazowego {base_timeframe}.")
+    if target_ms == base_ms or len(timestamps) == 0:
+        return timestamps, ohlcv
+
+    offset_ms = timeframe_offset_seconds(target_timeframe) * 1000
+    buckets = (timestamps - offset_ms) // target_ms
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], len(timestamps))
+    bucket_ts = buckets[starts] * target_ms + offset_ms
+
+    if timestamps[0] != bucket_ts[0]:
+        starts, ends, bucket_ts = starts[1:], ends[1:], bucket_ts[1:]
+        if len(starts) == 0:
+            return timestamps[:0], ohlcv[:0]
+
+    first = starts[0]
+    offsets = starts - first
+    result = np.empty((len(starts), 5), dtype=np.float64)
+    result[:, 0] = ohlcv[starts, 0]
+    result[:, 1] = np.maximum.reduceat(ohlcv[first:, 1], offsets)
+    result[:, 2] = np.minimum.reduceat(ohlcv[first:, 2], offsets)
+    result[:, 3] = ohlcv[ends - 1, 3]
+    result[:, 4] = np.add.reduceat(ohlcv[first:, 4], offsets)
+    return bucket_ts, result
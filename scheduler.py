@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from utils import timeframe_to_seconds, timeframe_offset_seconds
+
+def last_close(timeframe, now):
+    # Ostatnia granica świec (czas zamknięcia ostatniej zamkniętej świecy) w sekundach
+    period, offset = timeframe_to_seconds(timeframe), timeframe_offset_seconds(timeframe)
+    return (now - offset) // period * period + offset
+
+def next_close(timeframe, now):
+    return last_close(timeframe, now) + timeframe_to_seconds(timeframe)
+
+class LatencyTracker:
+    def __init__(self, size=500):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        if not self.samples:
+            return {'count': 0, 'last': None, 'avg': None, 'max': None}
+        return {'count': len(self.samples), 'last': self.samples[-1],
+                'avg': sum(self.samples) / len(self.samples), 'max': max(self.samples)}
+
+class CandleScheduler:
+    # Budzi pętlę analityczną tuż po zamknięciu świecy (z zapasem `grace_seconds` na publikację świecy przez giełdę)
+    # i zwraca interwały, których świece właśnie się zamknęły - tylko je trzeba odświeżyć.
+    def __init__(self, timeframes, grace_seconds=5, clock=time.time):
+        self.timeframes = list(dict.fromkeys(timeframes))
+        self.grace_seconds = grace_seconds
+        self.clock = clock
+        self.last_boundary = None
+        self.cycle_latency = LatencyTracker()  # Od zamknięcia świecy do zakończenia analizy wszystkich symboli
+        self.signal_latency = LatencyTracker()  # Od zamknięcia świecy do wysłania sygnału
+
+    async def wait_for_close(self):
+        now = self.clock()
+        boundary = min(next_close(tf, now) for tf in self.timeframes)
+        await asyncio.sleep(max(boundary + self.grace_seconds - now, 0))
+        self.last_boundary = boundary
+        return [tf for tf in self.timeframes if last_close(tf, boundary) == boundary]
+
+    def record_cycle(self):
+        if self.last_boundary is not None:
+            self.cycle_latency.record(self.clock() - self.last_boundary)
+
+    def record_signal(self, candle_open_ms, timeframe):
+        # candle_open_ms: czas otwarcia świecy, na której powstał sygnał
+        close = candle_open_ms / 1000 + timeframe_to_seconds(timeframe)
+        latency = self.clock() - close
+        self.signal_latency.record(latency)
+        return latency
+
+    def log_latency(self):
+        cycle, signal = self.cycle_latency.summary(), self.signal_latency.summary()
+        if cycle['count']:
+            logging.info(f"Opóźnienie od zamknięcia świecy: cykl {cycle['last']:.1f}s (średnio {cycle['avg']:.1f}s, maks. {cycle['max']:.1f}s)"
+                         + (f", sygnały średnio {signal['avg']:.1f}s" if signal['count'] else ""))
+
+class PollPriority:
+    # Częstotliwość odświeżania par zależna od tego, jak blisko są sygnału: pary blisko progów RSI lub wstęg
+    # Bollingera odświeżane są w każdym cyklu (i jako pierwsze), a odległe co kilka cykli - najwyżej co
+    # max_interval. budget ogranicza liczbę par odświeżanych w jednym cyklu (0 - bez limitu), więc lista par
+    # może rosnąć bez zwiększania liczby zapytań do giełdy.
+    def __init__(self, rsi_oversold, rsi_overbought, budget=0, max_interval=4, rsi_margin=10.0, bb_margin=0.25):
+        self.rsi_oversold = rsi_oversold
+        self.rsi_overbought = rsi_overbought
+        self.budget = budget
+        self.max_interval = max_interval
+        self.rsi_margin = rsi_margin  # Odległość RSI od progu (w punktach), od której para jest "daleko"
+        self.bb_margin = bb_margin  # To samo dla ceny - jako ułamek szerokości wstęg
+        self.priorities = {}  # symbol -> priorytet 0..1 (1 - tuż przy sygnale)
+        self.last_polled = {}  # symbol -> numer cyklu ostatniego odświeżenia
+        self.cycle = 0
+
+    def _closeness(self, distance, margin):
+        return min(max(1.0 - distance / margin, 0.0), 1.0)
+
+    def priority(self, status):
+        # Bez statusu (nowa para, błąd, brak danych) - najwyższy priorytet. RSI przy płaskiej cenie (0/0)
+        # to NaN bez błędu w statusie - taka para też odświeżana jest w każdym cyklu
+        if not status or status.get('error') or status.get('rsi_value') is None or math.isnan(status['rsi_value']):
+            return 1.0
+        rsi, price = status['rsi_value'], status['price']
+        width = status['bb_upper'] - status['bb_lower']
+        to_lower = (price - status['bb_lower']) / width if width > 0 else 0.0
+        buy = min(self._closeness(abs(rsi - self.rsi_oversold), self.rsi_margin),
+                  self._closeness(max(to_lower, 0.0), self.bb_margin))
+        sell = min(self._closeness(abs(rsi - self.rsi_overbought), self.rsi_margin),
+                   self._closeness(max(1.0 - to_lower, 0.0), self.bb_margin))
+        # Sygnał wymaga zgodnego trendu; w trendzie bocznym liczy się bliższa ze stron, ale z niższą wagą
+        if status['trend'] == "WZROSTOWY":
+            return buy
+        if status['trend'] == "SPADKOWY":
+            return sell
+        return 0.5 * max(buy, sell)
+
+    def interval(self, symbol):
+        priority = self.priorities.get(symbol)
+        if priority is None or math.isnan(priority):
+            priority = 1.0
+        return 1 + round((self.max_interval - 1) * (1.0 - priority))
+
+    def select(self, symbols):
+        # Pary do odświeżenia w tym cyklu, od najbliższych sygnału; pominięte z powodu budżetu czekają na kolejny
+        self.cycle += 1
+        due = []
+        for symbol in symbols:
+            waited = self.cycle - self.last_polled.get(symbol, self.cycle - self.max_interval)
+            if waited >= self.interval(symbol):
+                due.append((waited / self.interval(symbol), self.priorities.get(symbol, 1.0), symbol))
+        due.sort(reverse=True)
+        if self.budget:
+            due = due[:self.budget]
+        return [symbol for _, _, symbol in due]
+
+    def record(self, statuses):
+        # statuses: {symbol: status} z cyklu analizy
+        for symbol, status in statuses.items():
+            priority = self.priority(status)
+            # NaN w cenie lub wstęgach daje priorytet NaN - zapisujemy najwyższy, żeby select mógł porównywać pary
+            self.priorities[symbol] = 1.0 if math.isnan(priority) else priority
+            self.last_polled[symbol] = self.cycle
+
+    def retain(self, symbols):
+        symbols = set(symbols)
+        for mapping in (self.priorities, self.last_polled):
+            for symbol in [s for s in mapping if s not in symbols]:
+                del mapping[symbol]
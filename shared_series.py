@@ -0,0 +1,36 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+# Serie świec w pamięci współdzielonej między procesami. Jeden blok: n znaczników czasu (int64),
+# a za nimi n x 5 wartości open, high, low, close, volume (float64).
+
+def series_views(shm, n):
+    timestamps = np.ndarray((n,), dtype=np.int64, buffer=shm.buf)
+    ohlcv = np.ndarray((n, 5), dtype=np.float64, buffer=shm.buf, offset=n * 8)
+    return timestamps, ohlcv
+
+def create_series(n):
+    shm = shared_memory.SharedMemory(create=True, size=max(n * 8 * 6, 1))
+    return (shm, *series_views(shm, n))
+
+def share_series(timestamps, ohlcv):
+    # Kopia serii w nowym bloku; zwraca blok i (nazwa, długość) do przekazania innym procesom
+    n = len(timestamps)
+    shm, shared_timestamps, shared_ohlcv = create_series(n)
+    shared_timestamps[:] = timestamps
+    shared_ohlcv[:] = ohlcv
+    return shm, (shm.name, n)
+
+def attach_series(name, n):
+    # Dołączenie do bloku utworzonego przez inny proces (tylko do odczytu); blokiem zarządza jego twórca
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: dołączenie rejestruje blok w resource_tracker, ale procesy robocze (fork, spawn
+        # i forkserver) korzystają z trackera procesu nadrzędnego, a ponowna rejestracja tej samej nazwy niczego
+        # nie zmienia. Wyrejestrowanie usunęłoby wpis twórcy (KeyError przy unlink, wyciek bloków po awarii)
+        shm = shared_memory.SharedMemory(name=name)
+    timestamps, ohlcv = series_views(shm, n)
+    timestamps.flags.writeable = False
+    ohlcv.flags.writeable = False
+    return shm, (timestamps, ohlcv)
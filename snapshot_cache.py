@@ -0,0 +1,112 @@
+import asyncio
+import time
+from config import TIMEFRAME_BASE, TIMEFRAME_MACRO, TIMEFRAME_MICRO
+from batch_screener import BatchScreener
+from scheduler import last_close
+from utils import SingleFlight, timeframe_to_seconds
+
+FIB_HISTORY = 500
+
+class SnapshotCache:
+    # Wspólna pamięć wyników analizy dla pętli analitycznej i bota: świece (CandleStore), ostatni status strategii
+    # i wynik Fibonacciego dla każdego symbolu, ze znacznikami czasu. Pętla zapisuje wyniki po każdym cyklu;
+    # bot korzysta z nich, a gdy są nieaktualne - liczy je na żądanie (jedno obliczenie na symbol naraz).
+    def __init__(self, candle_store, strategy_analyzer, indicator_engine):
+        self.candle_store = candle_store
+        self.strategy_analyzer = strategy_analyzer
+        self.indicator_engine = indicator_engine
+        self.bar_ms = (timeframe_to_seconds(TIMEFRAME_MACRO) * 1000, timeframe_to_seconds(TIMEFRAME_MICRO) * 1000)
+        self.screener = BatchScreener(strategy_analyzer)
+        self.entries = {}
+        self._flight = SingleFlight()
+
+    def _entry(self, symbol):
+        return self.entries.setdefault(symbol, {'status': None, 'status_at': 0.0, 'fib_legs': None, 'fib_candle': None})
+
+    def is_fresh(self, computed_at, timeframe=TIMEFRAME_MICRO):
+        # Wynik jest aktualny, jeśli policzono go po zamknięciu ostatniej świecy danego interwału
+        return computed_at >= last_close(timeframe, time.time())
+
+    def evaluate(self, symbol):
+        # Synchronizuje wskaźniki z zamkniętymi świecami i zapisuje status; zwraca (status, snapshot)
+        # lub (None, None), gdy brak danych
+        store = self.candle_store
+        if not store.has(symbol, TIMEFRAME_MACRO) or not store.has(symbol, TIMEFRAME_MICRO):
+            return None, None
+        self.indicator_engine.sync(symbol, *store.closed(symbol, TIMEFRAME_MACRO), *store.closed(symbol, TIMEFRAME_MICRO),
+                                   bar_ms=self.bar_ms)
+        snapshot = self.indicator_engine.snapshot(symbol)
+        status = self.strategy_analyzer.evaluate(snapshot)
+        self.record_status(symbol, status)
+        return status, snapshot
+
+    def record_status(self, symbol, status):
+        # Zapis statusu policzonego poza tym obiektem (np. przez proces analizy z workers.py)
+        entry = self._entry(symbol)
+        entry['status'], entry['status_at'] = status, time.time()
+
+    async def get_status(self, symbol):
+        entry = self._entry(symbol)
+        if entry['status'] is not None and self.is_fresh(entry['status_at']):
+            return entry['status']
+        return await self._flight.run(('status', symbol), lambda: self._compute_status(symbol))
+
+    async def _compute_status(self, symbol):
+        if not self.is_fresh(self.candle_store.refreshed_at.get(symbol, 0.0)):
+            await self.candle_store.refresh(symbol)
+        return self.evaluate(symbol)[0]
+
+    async def get_statuses(self, symbols, on_progress=None):
+        # Statusy wielu par naraz: aktualne z pamięci, a nieaktualne po równoległym odświeżeniu świec
+        # liczone jednym wektorowym przebiegiem (BatchScreener) zamiast pary po parze.
+        # on_progress(gotowe, wszystkie) wywoływane po odświeżeniu każdej pary
+        stale = [s for s in dict.fromkeys(symbols)
+                 if self._entry(s)['status'] is None or not self.is_fresh(self.entries[s]['status_at'])]
+        to_refresh = [s for s in stale if not self.is_fresh(self.candle_store.refreshed_at.get(s, 0.0))]
+        done = 0
+        async def refresh(symbol):
+            nonlocal done
+            await self.candle_store.refresh(symbol)
+            done += 1
+            if on_progress:
+                on_progress(done, len(to_refresh))
+        await asyncio.gather(*(refresh(s) for s in to_refresh))
+        computed_at = time.time()
+        for symbol, status in self.screener.screen(self.candle_store, stale, TIMEFRAME_MACRO, TIMEFRAME_MICRO).items():
+            if status is not None:
+                entry = self.entries[symbol]
+                entry['status'], entry['status_at'] = status, computed_at
+        return [self.entries[s]['status'] for s in symbols]
+
+    async def get_fibonacci(self, symbol):
+        if not self.is_fresh(self.candle_store.refreshed_at.get(symbol, 0.0)):
+            await self.candle_store.refresh(symbol)
+        return self.fibonacci(symbol)
+
+    def fibonacci(self, symbol):
+        # Punkty zwrotne liczone są ponownie tylko po zamknięciu nowej świecy makro;
+        # ocena względem bieżącej ceny jest tania i wykonywana za każdym razem
+        store = self.candle_store
+        if not store.has(symbol, TIMEFRAME_MACRO):
+            return None
+        timestamps, ohlcv = store.closed(symbol, TIMEFRAME_MACRO)
+        if len(timestamps) == 0:
+            return None
+        entry = self._entry(symbol)
+        if entry['fib_candle'] != int(timestamps[-1]):
+            timestamps, ohlcv = timestamps[-FIB_HISTORY:], ohlcv[-FIB_HISTORY:]
+            entry['fib_legs'] = self.strategy_analyzer.fibonacci_legs(timestamps, ohlcv[:, 1], ohlcv[:, 2])
+            entry['fib_candle'] = int(timestamps[-1])
+        current_price = float(store.get(symbol, TIMEFRAME_BASE).ohlcv[-1, 3])
+        return self.strategy_analyzer.fibonacci_report(entry['fib_legs'], current_price)
+
+    async def scan_golden_zone(self, symbols):
+        # Wyniki Fibonacciego wszystkich podanych par naraz; zwraca {symbol: wynik} dla par w "Złotej Strefie"
+        results = await asyncio.gather(*(self.get_fibonacci(symbol) for symbol in symbols))
+        return {symbol: result for symbol, result in zip(symbols, results)
+                if result and not result.get('error') and result['in_golden_zone']}
+
+    def retain(self, symbols):
+        symbols = set(symbols)
+        for symbol in [s for s in self.entries if s not in symbols]:
+            del self.entries[symbol]
@@ -0,0 +1,155 @@
+import logging
+from config import TIMEFRAME_MACRO, TIMEFRAME_MICRO
+from utils import timeframe_to_seconds
+from strategy_analyzer import StrategyAnalyzer, INDICATOR_PARAMS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Wiele strategii naraz na wspólnych wskaźnikach. Dane wejściowe strategii (migawka wskaźników, wynik Fibonacciego)
+# to węzły grafu zależności: każdy węzeł liczony jest najwyżej raz na parę w cyklu i tylko wtedy, gdy potrzebuje go
+# któraś strategia, więc kolejna strategia na tych samych wskaźnikach nie zwiększa kosztu ich obliczania.
+# Stan sygnałów (ostatni wysłany typ) jest osobny dla każdej pary (strategia, symbol). Para odświeżana rzadziej
+# niż co świecę (scheduler.PollPriority) sprawdzana jest po kolei na każdej świecy zamkniętej od poprzedniej analizy.
+
+class SignalContext:
+    # Wartości węzłów dla jednej pary i jednej świecy; values - wartości już znane (np. z procesów analizy).
+    # bar - czas świecy, latest - czy to najnowsza świeca, shared - pamięć wspólna dla wszystkich świec pary w cyklu
+    def __init__(self, symbol, providers, values=None, bar=None, latest=True, shared=None):
+        self.symbol = symbol
+        self.providers = providers
+        self.values = dict(values or {})
+        self.bar = bar
+        self.latest = latest
+        self.shared = shared if shared is not None else {}
+
+    def get(self, name):
+        if name not in self.values:
+            # Węzeł może sam pobierać inne węzły (context.get) - zależności liczone są przy pierwszym użyciu
+            self.values[name] = self.providers[name](self.symbol, self)
+        return self.values[name]
+
+class Strategy:
+    # Strategia: check(context) zwraca sygnał {'type', 'price', 'timestamp', 'reason'} lub None
+    indicator_params = None  # Parametry wskaźników strumieniowych (INDICATOR_PARAMS), jeśli strategia ich używa
+
+    def __init__(self, name, params=None):
+        self.name = name
+        self.params = params or {}
+        self.snapshot_key = 'snapshot'  # Ustawiane przez StrategyRegistry.add
+
+    def check(self, context):
+        raise NotImplementedError
+
+class EmaRsiBbStrategy(Strategy):
+    # Reguła StrategyAnalyzer: trend EMA (makro), wyjście RSI ze strefy, dotknięcie wstęgi Bollingera i wolumen.
+    # Warianty z innymi progami (np. rsi_oversold) korzystają z tej samej migawki wskaźników.
+    def __init__(self, name, params=None):
+        super().__init__(name, params)
+        self.analyzer = StrategyAnalyzer(params)
+        self.indicator_params = {key: self.analyzer.params[key] for key in INDICATOR_PARAMS}
+
+    def check(self, context):
+        snapshot = context.get(self.snapshot_key)
+        return self.analyzer.analyze_snapshot(snapshot) if snapshot is not None else None
+
+class FibGoldenZoneStrategy(Strategy):
+    # Cena w "Złotej Strefie" (50-61.8%) ostatniego ruchu: korekta w trendzie wzrostowym - BUY, w spadkowym - SELL.
+    # To stan, nie przecięcie progu - sprawdzany tylko na najnowszej świecy (pominięta świeca go nie gubi)
+    def check(self, context):
+        fib, snapshot = context.get('fibonacci'), context.get(self.snapshot_key)
+        if not fib or fib.get('error') or not fib['in_golden_zone'] or snapshot is None:
+            return None
+        return {'type': 'BUY' if fib['trend'] == "WZROSTOWY" else 'SELL', 'price': fib['current_price'],
+                'timestamp': snapshot['timestamp'], 'reason': f"Cena w 'Złotej Strefie' Fibonacciego ({fib['trend'].lower()} ruch)."}
+
+# Typy strategii dostępne w konfiguracji (STRATEGIES); własne typy można dopisać przez register_strategy_type
+STRATEGY_TYPES = {
+    'ema_rsi_bb': EmaRsiBbStrategy,
+    'fib_golden_zone': FibGoldenZoneStrategy,
+}
+
+def register_strategy_type(type_name, strategy_class):
+    STRATEGY_TYPES[type_name] = strategy_class
+
+class StrategyRegistry:
+    def __init__(self, snapshot_cache):
+        self.snapshot_cache = snapshot_cache
+        self.strategies = {}
+        self.engines = {}  # klucz węzła -> IndicatorEngine dla wariantów o innych parametrach wskaźników
+        base = snapshot_cache.strategy_analyzer.params
+        self.base_indicator_params = {key: base[key] for key in INDICATOR_PARAMS}
+        self.providers = {
+            'snapshot': lambda symbol, context: snapshot_cache.evaluate(symbol)[1],
+            'fibonacci': lambda symbol, context: snapshot_cache.fibonacci(symbol) if context.latest else None,
+        }
+        self.bar_ms = (timeframe_to_seconds(TIMEFRAME_MACRO) * 1000, timeframe_to_seconds(TIMEFRAME_MICRO) * 1000)
+
+    @classmethod
+    def from_config(cls, snapshot_cache, config):
+        # config: lista {'name', 'type', 'params'} (STRATEGIES z config.py)
+        registry = cls(snapshot_cache)
+        for entry in config:
+            strategy_class = STRATEGY_TYPES.get(entry.get('type'))
+            if strategy_class is None:
+                logging.error(f"Nieznany typ strategii '{entry.get('type')}' ({entry.get('name')}), pomijam.")
+                continue
+            registry.add(strategy_class(entry['name'], entry.get('params')))
+        return registry
+
+    def add(self, strategy):
+        # Strategie z tymi samymi parametrami wskaźników co analizator SnapshotCache korzystają z jego migawki;
+        # dla innych parametrów powstaje osobny węzeł (jeden na zestaw parametrów, wspólny dla wariantów)
+        params = strategy.indicator_params
+        if params is not None and params != self.base_indicator_params:
+            key = 'snapshot:' + ','.join(f"{k}={params[k]}" for k in INDICATOR_PARAMS)
+            if key not in self.providers:
+                self.engines[key] = StrategyAnalyzer(params).create_engine()
+                self.providers[key] = self._engine_snapshot(self.engines[key])
+            strategy.snapshot_key = key
+        self.strategies[strategy.name] = strategy
+        logging.info(f"Dodano strategię {strategy.name} ({type(strategy).__name__}).")
+
+    def remove(self, name):
+        return self.strategies.pop(name, None) is not None
+
+    def _engine_snapshot(self, engine):
+        store = self.snapshot_cache.candle_store
+        def provider(symbol, context):
+            # Synchronizacja raz na parę w cyklu; każda świeca dostaje swoje wartości (None, gdy silnik jej nie zna)
+            if engine not in context.shared:
+                bars = {}
+                if store.has(symbol, TIMEFRAME_MACRO) and store.has(symbol, TIMEFRAME_MICRO):
+                    engine.sync(symbol, *store.closed(symbol, TIMEFRAME_MACRO), *store.closed(symbol, TIMEFRAME_MICRO),
+                                bar_ms=self.bar_ms)
+                    snapshot = engine.snapshot(symbol)
+                    bars = {values['timestamp']: values for values in [*engine.take_missed(symbol), snapshot] if values}
+                context.shared[engine] = bars
+            return context.shared[engine].get(context.bar)
+        return provider
+
+    def contexts(self, symbol, snapshot, missed=()):
+        # Konteksty świec zamkniętych od poprzedniej analizy pary (missed, od najstarszej) i najnowszej (snapshot)
+        shared = {}
+        bars = [*missed, snapshot]
+        return [SignalContext(symbol, self.providers, {'snapshot': values}, values['timestamp'], i == len(bars) - 1, shared)
+                for i, values in enumerate(bars)]
+
+    def signals(self, context, state):
+        # state: {strategia: ostatni typ sygnału} tej pary; zwraca tylko nowe sygnały (zmiana typu dla strategii)
+        new = []
+        for name, strategy in self.strategies.items():
+            try:
+                signal = strategy.check(context)
+            except Exception as e:
+                logging.error(f"Błąd strategii {name} dla {context.symbol}: {e}", exc_info=True)
+                continue
+            if signal is None:
+                state.pop(name, None)
+            elif state.get(name) != signal['type']:
+                state[name] = signal['type']
+                new.append({**signal, 'symbol': context.symbol, 'strategy': name})
+        return new
+
+    def retain(self, symbols):
+        for engine in self.engines.values():
+            engine.retain(symbols)
@@ -1,25 +1,48 @@
-import pandas as pd
-import pandas_ta as ta
+import math
 import logging
 from config import (
     EMA_FAST_PERIOD, EMA_SLOW_PERIOD, RSI_PERIOD, RSI_OVERSOLD, RSI_OVERBOUGHT,
     BB_LENGTH, BB_STD, VOLUME_MULTIPLIER, FIB_SWING_STRENGTH
 )
+from indicators import IndicatorEngine, VOLUME_AVG_PERIOD
+from metrics import ANALYSIS_SECONDS, timed
+from swing_detector import swing_legs, golden_zone_status, in_golden_zone, format_time
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Domyślne parametry strategii z config.py; każda instancja StrategyAnalyzer może je nadpisać
+DEFAULT_PARAMS = {
+    'ema_fast_period': EMA_FAST_PERIOD, 'ema_slow_period': EMA_SLOW_PERIOD, 'rsi_period': RSI_PERIOD,
+    'rsi_oversold': RSI_OVERSOLD, 'rsi_overbought': RSI_OVERBOUGHT, 'bb_length': BB_LENGTH, 'bb_std': BB_STD,
+    'volume_multiplier': VOLUME_MULTIPLIER, 'volume_period': VOLUME_AVG_PERIOD,
+}
+INDICATOR_PARAMS = ('ema_fast_period', 'ema_slow_period', 'rsi_period', 'bb_length', 'bb_std', 'volume_period')
+# Wartości liczbowe w statusie (obok opisów) - m.in. do oceny, jak blisko para jest sygnału
+STATUS_VALUES = ('rsi_value', 'price', 'bb_lower', 'bb_upper')
+
 class StrategyAnalyzer:
     # ... (metody __init__, analyze, get_status pozostają bez zmian) ...
-    def __init__(self):
-        self.last_signal = None
+    def __init__(self, params=None):
+        self.params = {**DEFAULT_PARAMS, **(params or {})}
+        self.fib_swing_strength = FIB_SWING_STRENGTH
+
+    def create_engine(self):
+        # Silnik wskaźników strumieniowych z parametrami tej instancji
+        return IndicatorEngine(**{key: self.params[key] for key in INDICATOR_PARAMS})
 
+    @timed(ANALYSIS_SECONDS.labels('analyze'))
     def analyze(self, df_macro, df_micro):
-        status = self.get_status(df_macro, df_micro)
+        return self.analyze_snapshot(self.compute_snapshot(df_macro, df_micro))
+
+    @timed(ANALYSIS_SECONDS.labels('analyze_snapshot'))
+    def analyze_snapshot(self, snapshot):
+        # snapshot: najnowsze wartości wskaźników (compute_snapshot lub IndicatorEngine.snapshot)
+        status = self.evaluate(snapshot)
         if status.get('error'):
             logging.warning(status['error'])
             return None
 
-        current_price = df_micro.iloc[-1]['close']
+        current_price = snapshot['price']
         is_bullish_trend = status['trend'] == "WZROSTOWY"
         is_bearish_trend = status['trend'] == "SPADKOWY"
         buy_signal_rsi = status['rsi_buy_trigger']
@@ -29,110 +52,112 @@ class StrategyAnalyzer:
         volume_confirmed = status['volume_confirmed']
         signal = None
 
+        # Bez stanu: powtórzenia tego samego sygnału pomija wywołujący (osobno dla każdej pary i strategii)
         if is_bullish_trend and buy_signal_rsi and buy_signal_bb and volume_confirmed:
-            if self.last_signal != 'BUY':
-                signal = {'type': 'BUY', 'price': current_price, 'timestamp': df_micro.index[-1], 'reason': 'Zgodność trendu, RSI, BB i wolumenu.'}
-                self.last_signal = 'BUY'
+            signal = {'type': 'BUY', 'price': current_price, 'timestamp': snapshot['timestamp'], 'reason': 'Zgodność trendu, RSI, BB i wolumenu.'}
         elif is_bearish_trend and sell_signal_rsi and sell_signal_bb and volume_confirmed:
-            if self.last_signal != 'SELL':
-                signal = {'type': 'SELL', 'price': current_price, 'timestamp': df_micro.index[-1], 'reason': 'Zgodność trendu, RSI, BB i wolumenu.'}
-                self.last_signal = 'SELL'
+            signal = {'type': 'SELL', 'price': current_price, 'timestamp': snapshot['timestamp'], 'reason': 'Zgodność trendu, RSI, BB i wolumenu.'}
         return signal
 
+    @timed(ANALYSIS_SECONDS.labels('get_status'))
     def get_status(self, df_macro, df_micro):
+        return self.evaluate(self.compute_snapshot(df_macro, df_micro))
+
+    def compute_snapshot(self, df_macro, df_micro):
+        # Wartości wskaźników z pełnej historii (pandas_ta); ramki wejściowe nie są modyfikowane.
+        # pandas_ta importowany przy pierwszym użyciu - pętla analizy używa wskaźników strumieniowych
+        import pandas_ta as ta
         try:
-            df_macro['EMA_FAST'] = ta.ema(df_macro['close'], length=EMA_FAST_PERIOD)
-            df_macro['EMA_SLOW'] = ta.ema(df_macro['close'], length=EMA_SLOW_PERIOD)
-            df_micro['RSI'] = ta.rsi(df_micro['close'], length=RSI_PERIOD)
-            df_micro['AVG_VOLUME'] = ta.sma(df_micro['volume'], length=20)
-            df_micro.ta.bbands(close=df_micro['close'], length=BB_LENGTH, std=BB_STD, append=True)
-            
-            bb_lower_col = next((col for col in df_micro.columns if col.startswith('BBL')), None)
-            bb_upper_col = next((col for col in df_micro.columns if col.startswith('BBU')), None)
-            
-            if not bb_lower_col or not bb_upper_col or df_macro['EMA_SLOW'].isnull().all() or df_micro[bb_lower_col].isnull().all():
+            p = self.params
+            ema_fast = ta.ema(df_macro['close'], length=p['ema_fast_period'])
+            ema_slow = ta.ema(df_macro['close'], length=p['ema_slow_period'])
+            rsi = ta.rsi(df_micro['close'], length=p['rsi_period'])
+            avg_volume = ta.sma(df_micro['volume'], length=p['volume_period'])
+            bbands = ta.bbands(df_micro['close'], length=p['bb_length'], std=p['bb_std'])
+            if any(series is None for series in (ema_fast, ema_slow, rsi, avg_volume, bbands)) or len(df_micro) < 2:
+                return {'error': 'Niewystarczająca ilość danych do analizy.'}
+
+            bb_lower_col = next(col for col in bbands.columns if col.startswith('BBL'))
+            bb_upper_col = next(col for col in bbands.columns if col.startswith('BBU'))
+            return {
+                'macro_close': df_macro['close'].iloc[-1], 'ema_fast': ema_fast.iloc[-1], 'ema_slow': ema_slow.iloc[-1],
+                'price': df_micro['close'].iloc[-1], 'rsi': rsi.iloc[-1], 'prev_rsi': rsi.iloc[-2],
+                'volume': df_micro['volume'].iloc[-1], 'avg_volume': avg_volume.iloc[-1],
+                'bb_lower': bbands[bb_lower_col].iloc[-1], 'bb_upper': bbands[bb_upper_col].iloc[-1],
+                'timestamp': df_micro.index[-1],
+            }
+        except Exception as e:
+            logging.error(f"Błąd w compute_snapshot: {e}", exc_info=True)
+            return {'error': f'Wyjątek w analizie: {e}'}
+
+    @timed(ANALYSIS_SECONDS.labels('evaluate'))
+    def evaluate(self, snapshot):
+        try:
+            if snapshot is None:
+                return {'error': 'Niewystarczająca ilość danych do analizy.'}
+            if snapshot.get('error'):
+                return {'error': snapshot['error']}
+            if math.isnan(snapshot['ema_slow']) or math.isnan(snapshot['bb_lower']):
                 return {'error': 'Niewystarczająca ilość danych do analizy.'}
 
-            latest_macro, latest_micro, previous_micro = df_macro.iloc[-1], df_micro.iloc[-1], df_micro.iloc[-2]
+            macro_close, ema_fast, ema_slow = snapshot['macro_close'], snapshot['ema_fast'], snapshot['ema_slow']
             trend_status = "BOCZNY"
-            if (latest_macro['close'] > latest_macro['EMA_FAST']) and (latest_macro['EMA_FAST'] > latest_macro['EMA_SLOW']):
+            if (macro_close > ema_fast) and (ema_fast > ema_slow):
                 trend_status = "WZROSTOWY"
-            elif (latest_macro['close'] < latest_macro['EMA_FAST']) and (latest_macro['EMA_FAST'] < latest_macro['EMA_SLOW']):
+            elif (macro_close < ema_fast) and (ema_fast < ema_slow):
                 trend_status = "SPADKOWY"
             
-            rsi_value = latest_micro['RSI']
+            rsi_oversold, rsi_overbought = self.params['rsi_oversold'], self.params['rsi_overbought']
+            rsi_value, previous_rsi = snapshot['rsi'], snapshot['prev_rsi']
             rsi_status = f"Neutralny ({rsi_value:.2f})"
-            if rsi_value <= RSI_OVERSOLD: rsi_status = f"Wyprzedany ({rsi_value:.2f})"
-            elif rsi_value >= RSI_OVERBOUGHT: rsi_status = f"Wykupiony ({rsi_value:.2f})"
+            if rsi_value <= rsi_oversold: rsi_status = f"Wyprzedany ({rsi_value:.2f})"
+            elif rsi_value >= rsi_overbought: rsi_status = f"Wykupiony ({rsi_value:.2f})"
             
-            price = latest_micro['close']
-            lower_band, upper_band = latest_micro[bb_lower_col], latest_micro[bb_upper_col]
+            price = snapshot['price']
+            lower_band, upper_band = snapshot['bb_lower'], snapshot['bb_upper']
             bb_status = "Cena wewnątrz wstęg"
             if price <= lower_band: bb_status = "Cena dotyka dolnej wstęgi"
             elif price >= upper_band: bb_status = "Cena dotyka górnej wstęgi"
 
             return {
                 'trend': trend_status, 'rsi': rsi_status, 'bb_status': bb_status,
-                'volume_confirmed': latest_micro['volume'] > (latest_micro['AVG_VOLUME'] * VOLUME_MULTIPLIER),
-                'rsi_buy_trigger': previous_micro['RSI'] <= RSI_OVERSOLD and rsi_value > RSI_OVERSOLD,
-                'rsi_sell_trigger': previous_micro['RSI'] >= RSI_OVERBOUGHT and rsi_value < RSI_OVERBOUGHT,
-                'bb_buy_trigger': price <= lower_band, 'bb_sell_trigger': price >= upper_band, 'error': None
+                'volume_confirmed': snapshot['volume'] > (snapshot['avg_volume'] * self.params['volume_multiplier']),
+                'rsi_buy_trigger': previous_rsi <= rsi_oversold and rsi_value > rsi_oversold,
+                'rsi_sell_trigger': previous_rsi >= rsi_overbought and rsi_value < rsi_overbought,
+                'bb_buy_trigger': price <= lower_band, 'bb_sell_trigger': price >= upper_band,
+                'rsi_value': float(rsi_value), 'price': float(price),
+                'bb_lower': float(lower_band), 'bb_upper': float(upper_band), 'error': None
             }
         except Exception as e:
             logging.error(f"Błąd w get_status: {e}", exc_info=True)
             return {'error': f'Wyjątek w analizie: {e}'}
             
     def analyze_fibonacci(self, df):
+        # Poziomy Fibonacciego dla ostatniego ruchu między punktami zwrotnymi (fraktale o sile FIB_SWING_STRENGTH)
         try:
-            # Używamy nieco mniej danych, aby uniknąć błędów na nowych parach
-            if len(df) < 250:
-                return {'error': f'Niewystarczająca ilość danych historycznych ({len(df)} świec). Potrzeba co najmniej 250.'}
-                
-            df['EMA_200'] = ta.ema(df['close'], length=200)
-            if df['EMA_200'].isnull().all():
-                return {'error': 'Nie można obliczyć EMA 200 (za mało danych).'}
-            
-            latest_price = df['close'].iloc[-1]
-            latest_ema = df['EMA_200'].iloc[-1]
-            trend = "WZROSTOWY" if latest_price > latest_ema else "SPADKOWY"
-
-            # Uproszczony i bardziej niezawodny algorytm znajdowania swingów
-            if trend == "WZROSTOWY":
-                # Znajdź najwyższy szczyt w ostatnich 150 świecach
-                end_point = df['high'][-150:].idxmax()
-                # Znajdź najniższy dołek PRZED tym szczytem
-                start_point = df['low'][:end_point][-150:].idxmin()
-                start_price, end_price = df.loc[start_point]['low'], df.loc[end_point]['high']
-            else: # Trend spadkowy
-                # Znajdź najniższy dołek w ostatnich 150 świecach
-                end_point = df['low'][-150:].idxmin()
-                # Znajdź najwyższy szczyt PRZED tym dołkiem
-                start_point = df['high'][:end_point][-150:].idxmax()
-                start_price, end_price = df.loc[start_point]['high'], df.loc[end_point]['low']
-            
-            if start_point == end_point:
-                return {'error': 'Nie można zidentyfikować wyraźnego ruchu cenowego (impuls).'}
+            legs = self.fibonacci_legs(df.index.values.astype('datetime64[ms]').astype('int64'),
+                                       df['high'].to_numpy(dtype=float), df['low'].to_numpy(dtype=float))
+        except Exception as e:
+            logging.error(f"Błąd w analyze_fibonacci: {e}", exc_info=True)
+            return {'error': f'Wystąpił nieoczekiwany wyjątek: {e}'}
+        return self.fibonacci_report(legs, df['close'].iloc[-1])
 
-            price_range = end_price - start_price
-            if price_range == 0:
-                return {'error': 'Zakres cenowy wynosi zero, nie można obliczyć poziomów.'}
+    def fibonacci_legs(self, timestamps, high, low):
+        # Kosztowna część analizy - zależy tylko od zamkniętych świec, więc wynik można przechowywać do kolejnej świecy
+        return swing_legs(timestamps, high, low, self.fib_swing_strength)
 
-            levels = {f'{lvl:.3f}': end_price - price_range * lvl for lvl in [0.382, 0.5, 0.618]}
-            
-            status = ""
-            gz_top, gz_bottom = (levels['0.500'], levels['0.618']) if trend == "WZROSTOWY" else (levels['0.618'], levels['0.500'])
-            
-            if gz_bottom <= latest_price <= gz_top:
-                status = "Cena w 'Złotej Strefie'."
-            elif (trend == "WZROSTOWY" and latest_price > levels['0.382']) or (trend == "SPADKOWY" and latest_price < levels['0.382']):
-                status = "Korekta jest płytka. Silny trend."
-            elif (trend == "WZROSTOWY" and latest_price < gz_bottom) or (trend == "SPADKOWY" and latest_price > gz_bottom):
-                status = "Cena przebiła 'Złotą Strefę'. Możliwa zmiana trendu."
-            
+    def fibonacci_report(self, legs, current_price, recent=5):
+        try:
+            if not legs:
+                return {'error': 'Nie można zidentyfikować wyraźnego ruchu cenowego (impuls) - za mało punktów zwrotnych.'}
+            leg = legs[-1]
+            if leg['end_price'] == leg['start_price']:
+                return {'error': 'Zakres cenowy wynosi zero, nie można obliczyć poziomów.'}
             return {
-                'trend': trend, 'swing_start_price': start_price, 'swing_start_date': start_point.strftime('%Y-%m-%d %H:%M'),
-                'swing_end_price': end_price, 'swing_end_date': end_point.strftime('%Y-%m-%d %H:%M'),
-                'levels': levels, 'current_price': latest_price, 'status': status, 'error': None
+                'trend': leg['trend'], 'swing_start_price': leg['start_price'], 'swing_start_date': format_time(leg['start_time']),
+                'swing_end_price': leg['end_price'], 'swing_end_date': format_time(leg['end_time']),
+                'levels': leg['levels'], 'current_price': current_price, 'status': golden_zone_status(leg, current_price),
+                'in_golden_zone': in_golden_zone(leg, current_price), 'legs': legs[-recent:], 'error': None
             }
         except Exception as e:
             logging.error(f"Błąd w analyze_fibonacci: {e}", exc_info=True)
@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+
+SUBSCRIPTIONS_FILE = 'subscriptions.json'
+ALL = '*'
+SIGNAL_TYPES = ('BUY', 'SELL')
+
+class SubscriptionIndex:
+    # Subskrypcje czatów: które pary (lub wszystkie - ALL) i jakie typy sygnałów chce dostawać każdy czat.
+    # Indeks (para, typ) -> czaty sprawia, że rozesłanie sygnału to dwa odczyty ze słownika,
+    # niezależnie od liczby subskrybentów.
+    def __init__(self, path=SUBSCRIPTIONS_FILE):
+        self.path = path
+        self.chats = {}  # chat_id -> {'symbols': set, 'types': set}
+        self.index = {}  # (para lub ALL, typ) -> set(chat_id)
+
+    def _index_chat(self, chat_id, add):
+        chat = self.chats[chat_id]
+        for symbol in chat['symbols']:
+            for signal_type in chat['types']:
+                key = (symbol, signal_type)
+                if add:
+                    self.index.setdefault(key, set()).add(chat_id)
+                else:
+                    chats = self.index.get(key)
+                    if chats:
+                        chats.discard(chat_id)
+                        if not chats:
+                            del self.index[key]
+
+    def _update_chat(self, chat_id, symbols=None, types=None):
+        chat_id = str(chat_id)
+        if chat_id in self.chats:
+            self._index_chat(chat_id, add=False)
+        chat = self.chats.setdefault(chat_id, {'symbols': set(), 'types': set(SIGNAL_TYPES)})
+        if symbols is not None:
+            chat['symbols'] = set(symbols)
+        if types is not None:
+            chat['types'] = set(types)
+        if not chat['symbols'] or not chat['types']:
+            del self.chats[chat_id]
+        else:
+            self._index_chat(chat_id, add=True)
+
+    def subscribers(self, symbol, signal_type):
+        return self.index.get((symbol, signal_type), set()) | self.index.get((ALL, signal_type), set())
+
+    def get(self, chat_id):
+        return self.chats.get(str(chat_id))
+
+    def subscribe(self, chat_id, symbol=ALL):
+        chat = self.get(chat_id)
+        symbols = set() if chat is None or symbol == ALL else set(chat['symbols'])
+        symbols.add(symbol)
+        self._update_chat(chat_id, symbols=symbols)
+        self.save()
+
+    def unsubscribe(self, chat_id, symbol=ALL):
+        # ALL usuwa wszystkie subskrypcje czatu
+        chat = self.get(chat_id)
+        if chat is None:
+            return False
+        if symbol == ALL:
+            self._update_chat(chat_id, symbols=set())
+        elif symbol in chat['symbols']:
+            self._update_chat(chat_id, symbols=chat['symbols'] - {symbol})
+        else:
+            return False
+        self.save()
+        return True
+
+    def set_types(self, chat_id, types):
+        if self.get(chat_id) is None:
+            return False
+        self._update_chat(chat_id, types=types)
+        self.save()
+        return True
+
+    def load(self, default_chat_id=None):
+        # Bez pliku (pierwsze uruchomienie) czat z TELEGRAM_CHAT_ID dostaje wszystkie sygnały - jak dotychczas
+        self.chats, self.index = {}, {}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            if default_chat_id:
+                self._update_chat(default_chat_id, symbols={ALL})
+                self.save()
+            return self
+        for chat_id, chat in data.get('chats', {}).items():
+            self._update_chat(chat_id, symbols=chat.get('symbols', []), types=chat.get('types', SIGNAL_TYPES))
+        logging.info(f"Wczytano subskrypcje {len(self.chats)} czatów.")
+        return self
+
+    def save(self):
+        data = {'chats': {chat_id: {'symbols': sorted(chat['symbols']), 'types': sorted(chat['types'])}
+                          for chat_id, chat in self.chats.items()}}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.path)
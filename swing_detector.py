@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+FIB_LEVELS = (0.382, 0.5, 0.618)
+
+def find_pivots(high, low, strength):
+    # Punkty zwrotne typu fraktal: szczyt to świeca, której high jest maksimum w oknie `strength` świec
+    # z każdej strony (dołek analogicznie dla low). Zwraca indeksy szczytów i dołków.
+    window = 2 * strength + 1
+    if len(high) < window:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    window_max = sliding_window_view(high, window).max(axis=1)
+    window_min = sliding_window_view(low, window).min(axis=1)
+    center = slice(strength, len(high) - strength)
+    highs = np.flatnonzero(high[center] == window_max) + strength
+    lows = np.flatnonzero(low[center] == window_min) + strength
+    return highs, lows
+
+def swing_legs(timestamps, high, low, strength):
+    # Ruchy cenowe między kolejnymi, naprzemiennymi punktami zwrotnymi (od najstarszego).
+    # Kilka szczytów (dołków) z rzędu zastępowanych jest najbardziej skrajnym.
+    highs, lows = find_pivots(high, low, strength)
+    points = sorted([(int(i), 1, float(high[i])) for i in highs] + [(int(i), -1, float(low[i])) for i in lows])
+    swings = []
+    for index, kind, price in points:
+        if swings and swings[-1][1] == kind:
+            if (kind == 1 and price > swings[-1][2]) or (kind == -1 and price < swings[-1][2]):
+                swings[-1] = (index, kind, price)
+        else:
+            swings.append((index, kind, price))
+
+    legs = []
+    for (start, _, start_price), (end, kind, end_price) in zip(swings, swings[1:]):
+        legs.append({
+            'trend': "WZROSTOWY" if kind == 1 else "SPADKOWY",
+            'start_price': start_price, 'start_time': int(timestamps[start]),
+            'end_price': end_price, 'end_time': int(timestamps[end]),
+            'levels': retracement_levels(start_price, end_price),
+        })
+    return legs
+
+def retracement_levels(start_price, end_price):
+    price_range = end_price - start_price
+    return {f'{lvl:.3f}': end_price - price_range * lvl for lvl in FIB_LEVELS}
+
+def golden_zone_status(leg, price):
+    levels, trend = leg['levels'], leg['trend']
+    gz_top, gz_bottom = (levels['0.500'], levels['0.618']) if trend == "WZROSTOWY" else (levels['0.618'], levels['0.500'])
+    if gz_bottom <= price <= gz_top:
+        return "Cena w 'Złotej Strefie'."
+    if (trend == "WZROSTOWY" and price > levels['0.382']) or (trend == "SPADKOWY" and price < levels['0.382']):
+        return "Korekta jest płytka. Silny trend."
+    if (trend == "WZROSTOWY" and price < gz_bottom) or (trend == "SPADKOWY" and price > gz_bottom):
+        return "Cena przebiła 'Złotą Strefę'. Możliwa zmiana trendu."
+    return ""
+
+def in_golden_zone(leg, price):
+    low, high = sorted((leg['levels']['0.500'], leg['levels']['0.618']))
+    return low <= price <= high
+
+def format_time(timestamp_ms):
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M')
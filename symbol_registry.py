@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+from utils import normalize_symbol
+
+SYMBOLS_FILE = 'monitored_symbols.json'
+
+class SymbolRegistry:
+    # Lista monitorowanych par w pamięci - jedno źródło prawdy dla pętli analizy i bota.
+    # Zmiany zapisywane są atomowo (plik tymczasowy + os.replace), a plik czytany jest ponownie tylko,
+    # gdy zmieni się jego czas modyfikacji (np. po ręcznej edycji). Dodanie i usunięcie par zgłaszane jest
+    # słuchaczom listener(dodane, usunięte), więc pamięci podręczne aktualizują się tylko przy zmianie listy.
+    def __init__(self, path=SYMBOLS_FILE):
+        self.path = path
+        self._symbols = {}  # dict jako zbiór z zachowaniem kolejności dodania
+        self._mtime = None
+        self.listeners = []
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def _notify(self, added, removed):
+        if not added and not removed:
+            return
+        for listener in self.listeners:
+            try:
+                listener(added, removed)
+            except Exception as e:
+                logging.error(f"Błąd obsługi zmiany listy par: {e}", exc_info=True)
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload(self):
+        # Odczyt z dysku tylko po zmianie pliku; zwraca True, gdy lista par się zmieniła
+        mtime = self._file_mtime()
+        if mtime == self._mtime:
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except ValueError as e:
+            # Uszkodzony plik - zostaje dotychczasowa lista, kolejna próba dopiero po następnej zmianie pliku
+            logging.error(f"Nie można odczytać listy par z {self.path}: {e}")
+            self._mtime = mtime
+            return False
+        self._mtime = mtime
+        symbols = dict.fromkeys(normalize_symbol(s) for s in data.get('symbols', []))
+        added = [s for s in symbols if s not in self._symbols]
+        removed = [s for s in self._symbols if s not in symbols]
+        self._symbols = symbols
+        if added or removed:
+            logging.info(f"Wczytano listę par: {len(symbols)} (dodane: {len(added)}, usunięte: {len(removed)}).")
+        self._notify(added, removed)
+        return bool(added or removed)
+
+    def load(self):
+        self.reload()
+        return self
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'symbols': list(self._symbols)}, f, indent=4)
+        os.replace(tmp_path, self.path)
+        self._mtime = self._file_mtime()
+
+    def symbols(self):
+        self.reload()
+        return list(self._symbols)
+
+    def __contains__(self, symbol):
+        self.reload()
+        return symbol in self._symbols
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def add(self, symbol):
+        symbol = normalize_symbol(symbol)
+        self.reload()
+        if symbol in self._symbols:
+            return False
+        self._symbols[symbol] = None
+        self.save()
+        self._notify([symbol], [])
+        return True
+
+    def remove(self, symbol):
+        self.reload()
+        if symbol not in self._symbols:
+            return False
+        del self._symbols[symbol]
+        self.save()
+        self._notify([], [symbol])
+        return True
@@ -7,10 +7,18 @@ from telegram.ext import (
     Application, CommandHandler, ConversationHandler, MessageHandler,
     CallbackQueryHandler, filters, ContextTypes
 )
-from config import TELEGRAM_BOT_TOKEN, TIMEFRAME_MACRO, TIMEFRAME_MICRO
-from exchange_client import ExchangeClient
-from strategy_analyzer import StrategyAnalyzer
-from utils import load_symbols, save_symbols
+from config import (
+    TELEGRAM_BOT_TOKEN, TIMEFRAME_MACRO, TIMEFRAME_MICRO,
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_INTERVAL, TELEGRAM_GROUP_INTERVAL, TELEGRAM_SEND_RETRIES,
+    SIGNAL_DIGEST_WINDOW, PROGRESS_EDIT_INTERVAL
+)
+from exchange_router import ExchangeRouter
+from message_queue import MessageSender, Coalescer, ProgressMessage, OUTBOX_FILE
+from metrics import SIGNAL_SEND_SECONDS, SIGNALS_SENT, timed
+from snapshot_cache import SnapshotCache
+from subscriptions import SubscriptionIndex, ALL, SIGNAL_TYPES
+from symbol_registry import SymbolRegistry
+from utils import normalize_symbol, parse_symbol
 
 # Ustawienie logowania
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,11 +27,20 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 CHOOSING, AWAITING_SYMBOL_TO_ADD, AWAITING_SYMBOL_TO_REMOVE, CHOOSING_FIB_SYMBOL = range(4)
 
 class TelegramBot:
-    def __init__(self, exchange_client: ExchangeClient, chat_id: str):
+    def __init__(self, exchange_client: ExchangeRouter, chat_id: str, snapshot_cache: SnapshotCache,
+                 symbol_registry: SymbolRegistry):
         self.exchange_client = exchange_client
+        self.snapshot_cache = snapshot_cache
+        self.symbol_registry = symbol_registry
         self.chat_id = chat_id
         self.app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-        self.strategy_analyzer = StrategyAnalyzer()
+        # Odbiorcy sygnałów: czaty z subskrypcjami (chat_id z konfiguracji dostaje wszystko przy pierwszym uruchomieniu)
+        self.subscriptions = SubscriptionIndex().load(default_chat_id=chat_id)
+        self.sender = MessageSender(self.app.bot, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_INTERVAL, TELEGRAM_GROUP_INTERVAL,
+                                    retries=TELEGRAM_SEND_RETRIES, on_blocked=self.subscriptions.unsubscribe,
+                                    outbox_path=OUTBOX_FILE)
+        # Sygnały dla jednego czatu z krótkiego okna czasu (zwykle jednego cyklu) wysyłane są jako jedna wiadomość
+        self.coalescer = Coalescer(SIGNAL_DIGEST_WINDOW, self._send_signals)
 
         conv_handler = ConversationHandler(
             entry_points=[CommandHandler('start', self.start)],
@@ -35,6 +52,7 @@ class TelegramBot:
                     CallbackQueryHandler(self.handle_remove_symbol_start, pattern='^remove_symbol$'),
                     CallbackQueryHandler(self.test_pairs, pattern='^test_pairs$'),
                     CallbackQueryHandler(self.fib_start, pattern='^fibonacci$'),
+                    CallbackQueryHandler(self.fib_scan, pattern='^fib_scan$'),
                 ],
                 AWAITING_SYMBOL_TO_ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_add_symbol_receive)],
                 AWAITING_SYMBOL_TO_REMOVE: [CallbackQueryHandler(self.handle_remove_symbol_select, pattern='^remove_')],
@@ -43,12 +61,17 @@ class TelegramBot:
             fallbacks=[CommandHandler('start', self.start)],
         )
         self.app.add_handler(conv_handler)
+        self.app.add_handler(CommandHandler('subscribe', self.subscribe))
+        self.app.add_handler(CommandHandler('unsubscribe', self.unsubscribe))
+        self.app.add_handler(CommandHandler('subscriptions', self.show_subscriptions))
+        self.app.add_handler(CommandHandler('signals', self.signal_types))
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         keyboard = [
             [InlineKeyboardButton("📊 Monitorowane pary", callback_data='list_symbols')],
             [InlineKeyboardButton("🔬 Test strategii", callback_data='test_pairs')],
             [InlineKeyboardButton("〽️ Mierzenie Fibonacciego", callback_data='fibonacci')],
+            [InlineKeyboardButton("🟡 Skaner Złotej Strefy", callback_data='fib_scan')],
             [InlineKeyboardButton("➕ Dodaj parę", callback_data='add_symbol'),
              InlineKeyboardButton("➖ Usuń parę", callback_data='remove_symbol')],
         ]
@@ -64,7 +87,7 @@ class TelegramBot:
     # ... (wszystkie inne funkcje, takie jak list_symbols, test_pairs, fib_start, etc. pozostają bez zmian)
     async def list_symbols(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         query = update.callback_query
-        symbols = load_symbols()
+        symbols = self.symbol_registry.symbols()
         message = "Lista monitorowanych par jest pusta."
         if symbols:
             monitored_pairs = "\n - ".join(symbols)
@@ -79,25 +102,26 @@ class TelegramBot:
         await query.answer()
         await query.edit_message_text("🔬 Rozpoczynam szczegółowy test strategii...")
 
-        symbols = load_symbols()
+        symbols = self.symbol_registry.symbols()
         if not symbols:
             await query.edit_message_text("Lista par jest pusta. Nie ma czego testować.")
             await asyncio.sleep(2)
             return await self.start(update, context)
 
         report_parts = ["<b>🔬 Raport z testu strategii:</b>\n"]
-        for symbol in symbols:
-            await query.edit_message_text(f"🔬 Testuję {symbol}...")
-            df_macro = self.exchange_client.fetch_ohlcv(symbol, TIMEFRAME_MACRO, limit=300)
-            df_micro = self.exchange_client.fetch_ohlcv(symbol, TIMEFRAME_MICRO, limit=300)
+        # Wyniki z ostatniego cyklu analizy; nieaktualne są liczone dla wszystkich par jednym przebiegiem.
+        # Postęp pobierania pokazywany jest w tej samej wiadomości, ale edytowanej najwyżej co PROGRESS_EDIT_INTERVAL
+        progress = ProgressMessage(query, PROGRESS_EDIT_INTERVAL)
+        statuses = await self.snapshot_cache.get_statuses(
+            symbols, on_progress=lambda done, total: progress.update(f"🔬 Pobieranie danych: {done}/{total} par..."))
 
+        for symbol, status in zip(symbols, statuses):
             part = f"\n--- <b>{symbol}</b> ---\\n"
-            if df_macro.empty or df_micro.empty:
+            if status is None:
                 part += "❌ BŁĄD: Nie można pobrać danych z giełdy."
                 report_parts.append(part)
                 continue
 
-            status = self.strategy_analyzer.get_status(df_macro, df_micro)
             if status['error']:
                 part += f"⚠️ Błąd analizy: {status['error']}"
             else:
@@ -112,17 +136,16 @@ class TelegramBot:
                 part += f"{volume_emoji} <b>Potwierdzenie Wolumenem:</b> {'Tak' if status['volume_confirmed'] else 'Nie'}"
             
             report_parts.append(part)
-            await asyncio.sleep(1)
 
         final_report = "".join(report_parts)
         keyboard = [[InlineKeyboardButton("⬅️ Wróć do menu", callback_data='back_to_main')]]
-        await query.edit_message_text(final_report, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
+        await progress.finish(final_report, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
         return CHOOSING
 
     async def fib_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         query = update.callback_query
         await query.answer()
-        symbols = load_symbols()
+        symbols = self.symbol_registry.symbols()
         if not symbols:
             await query.edit_message_text('Lista monitorowanych par jest pusta. Dodaj parę, aby ją analizować.')
             await asyncio.sleep(3)
@@ -141,14 +164,12 @@ class TelegramBot:
         
         await query.edit_message_text(f"Analizuję {symbol} używając poziomów Fibonacciego...")
         
-        df = self.exchange_client.fetch_ohlcv(symbol, TIMEFRAME_MACRO, limit=500)
+        result = await self.snapshot_cache.get_fibonacci(symbol)
         
-        if df.empty:
+        if result is None:
             await query.edit_message_text(f"Nie można pobrać danych dla {symbol}.")
             await asyncio.sleep(3)
             return await self.start(update, context)
-            
-        result = self.strategy_analyzer.analyze_fibonacci(df)
         
         if result.get('error'):
             message = f"<b>Błąd analizy Fibonacciego dla {symbol}:</b>\n\n{result['error']}"
@@ -159,7 +180,28 @@ class TelegramBot:
         await query.edit_message_text(message, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
         return CHOOSING
 
-    def format_fib_report(self, symbol, data):
+    async def fib_scan(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        query = update.callback_query
+        await query.answer()
+        symbols = self.symbol_registry.symbols()
+        matches = await self.snapshot_cache.scan_golden_zone(symbols)
+
+        if matches:
+            lines = [f"<b>🟡 Pary w 'Złotej Strefie' ({len(matches)}/{len(symbols)}):</b>\n"]
+            for symbol, data in matches.items():
+                trend_emoji = "📈" if data['trend'] == "WZROSTOWY" else "📉"
+                lines.append(f"{trend_emoji} <b>{symbol}</b>: {data['current_price']:.4f} "
+                             f"(50%: {data['levels']['0.500']:.4f}, 61.8%: {data['levels']['0.618']:.4f})")
+            message = "\n".join(lines)
+        else:
+            message = f"Żadna z {len(symbols)} monitorowanych par nie jest obecnie w 'Złotej Strefie'."
+
+        keyboard = [[InlineKeyboardButton("⬅️ Wróć do menu", callback_data='back_to_main')]]
+        await query.edit_message_text(message, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
+        return CHOOSING
+
+    @staticmethod
+    def format_fib_report(symbol, data):
         trend_emoji = "📈" if data['trend'] == "WZROSTOWY" else "📉"
         report = f"<b>〽️ Analiza Fibonacciego dla {symbol}</b> {trend_emoji}\n\n"
         report += f"<b>Główny trend:</b> {data['trend']}\n"
@@ -178,32 +220,30 @@ class TelegramBot:
     async def handle_add_symbol_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         query = update.callback_query
         await query.answer()
-        await query.edit_message_text(text="Podaj parę, którą chcesz dodać (np. ETH/USDC, SOL/USDC).")
+        await query.edit_message_text(text="Podaj parę, którą chcesz dodać (np. ETH/USDC, SOL/USDC; z innej giełdy: kraken:BTC/USD).")
         return AWAITING_SYMBOL_TO_ADD
 
     async def handle_add_symbol_receive(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-        symbol_to_add = update.message.text.upper().strip()
+        symbol_to_add = normalize_symbol(update.message.text)
         if not '/' in symbol_to_add:
-            await update.message.reply_text("Nieprawidłowy format. Para musi zawierać '/', np. BTC/USDC.")
+            await update.message.reply_text("Nieprawidłowy format. Para musi zawierać '/', np. BTC/USDC lub kraken:BTC/USD.")
             return AWAITING_SYMBOL_TO_ADD
-        await update.message.reply_text(f"Sprawdzam, czy para '{symbol_to_add}' istnieje na Binance...")
-        if self.exchange_client.symbol_exists(symbol_to_add):
-            symbols = load_symbols()
-            if symbol_to_add not in symbols:
-                symbols.append(symbol_to_add)
-                save_symbols(symbols)
+        exchange_id = parse_symbol(symbol_to_add)[0]
+        await update.message.reply_text(f"Sprawdzam, czy para '{symbol_to_add}' istnieje na giełdzie {exchange_id}...")
+        if await self.exchange_client.symbol_exists(symbol_to_add):
+            if self.symbol_registry.add(symbol_to_add):
                 await update.message.reply_text(f"✅ Para '{symbol_to_add}' została pomyślnie dodana.")
             else:
                 await update.message.reply_text(f"⚠️ Para '{symbol_to_add}' już jest na liście.")
         else:
-            await update.message.reply_text(f"❌ Niestety, para '{symbol_to_add}' nie została znaleziona na Binance.")
+            await update.message.reply_text(f"❌ Niestety, para '{symbol_to_add}' nie została znaleziona na giełdzie {exchange_id}.")
         await update.message.reply_text("Możesz dodać kolejną parę lub wrócić do menu, wpisując /start.")
         return AWAITING_SYMBOL_TO_ADD
 
     async def handle_remove_symbol_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         query = update.callback_query
         await query.answer()
-        symbols = load_symbols()
+        symbols = self.symbol_registry.symbols()
         if not symbols:
             await query.edit_message_text('Lista monitorowanych par jest pusta.')
             await asyncio.sleep(2)
@@ -216,26 +256,104 @@ class TelegramBot:
         query = update.callback_query
         await query.answer()
         symbol_to_remove = query.data.split('_', 1)[1]
-        symbols = load_symbols()
-        if symbol_to_remove in symbols:
-            symbols.remove(symbol_to_remove)
-            save_symbols(symbols)
+        if self.symbol_registry.remove(symbol_to_remove):
             await query.edit_message_text(f"✅ Para '{symbol_to_remove}' została usunięta.")
         else:
             await query.edit_message_text(f"⚠️ Nie znaleziono pary '{symbol_to_remove}' na liście.")
         await asyncio.sleep(2)
         return await self.start(update, context)
 
+    @timed(SIGNAL_SEND_SECONDS)
     async def send_signal(self, signal_data):
-        message = self._format_signal_message(signal_data)
-        await self.app.bot.send_message(chat_id=self.chat_id, text=message, parse_mode='HTML')
+        # Nie czeka na Telegrama - wiadomości trafiają do kolejki wysyłki dla każdego subskrybenta
+        chats = self.subscriptions.subscribers(signal_data.get('symbol'), signal_data['type'])
+        if not chats:
+            return
+        for chat_id in chats:
+            self.coalescer.add(chat_id, signal_data)
+        SIGNALS_SENT.labels(signal_data['type']).inc()
 
-    def _format_signal_message(self, signal_data):
+    def _send_signals(self, chat_id, signals):
+        if len(signals) == 1:
+            message = self._format_signal_message(signals[0])
+        else:
+            message = self._format_digest_message(signals)
+        self.sender.send(chat_id, message, parse_mode='HTML')
+
+    async def shutdown(self):
+        # Sygnały czekające na zbiorczą wiadomość trafiają do kolejki, a kolejka jest opróżniana lub zapisywana
+        self.coalescer.flush_all()
+        await self.sender.stop()
+
+    # --- Subskrypcje (komendy) ---
+
+    async def subscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        if not context.args:
+            await update.message.reply_text("Użycie: /subscribe PARA (np. /subscribe BTC/USDC) lub /subscribe all")
+            return
+        symbol = ALL if context.args[0].lower() == 'all' else normalize_symbol(context.args[0])
+        self.subscriptions.subscribe(chat_id, symbol)
+        if symbol == ALL:
+            await update.message.reply_text("✅ Subskrybujesz sygnały wszystkich monitorowanych par.")
+        elif symbol not in self.symbol_registry:
+            await update.message.reply_text(f"✅ Dodano subskrypcję {symbol}. ⚠️ Ta para nie jest monitorowana - dodaj ją w menu (/start).")
+        else:
+            await update.message.reply_text(f"✅ Dodano subskrypcję {symbol}.")
+
+    async def unsubscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        symbol = ALL if not context.args or context.args[0].lower() == 'all' else normalize_symbol(context.args[0])
+        if self.subscriptions.unsubscribe(chat_id, symbol):
+            await update.message.reply_text("✅ Usunięto wszystkie subskrypcje." if symbol == ALL else f"✅ Usunięto subskrypcję {symbol}.")
+        else:
+            await update.message.reply_text("⚠️ Nie znaleziono takiej subskrypcji.")
+
+    async def signal_types(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        types = {arg.upper() for arg in context.args} & set(SIGNAL_TYPES)
+        if not types:
+            await update.message.reply_text("Użycie: /signals BUY, /signals SELL lub /signals BUY SELL")
+            return
+        if self.subscriptions.set_types(update.effective_chat.id, types):
+            await update.message.reply_text(f"✅ Otrzymujesz sygnały: {', '.join(sorted(types))}.")
+        else:
+            await update.message.reply_text("⚠️ Najpierw dodaj subskrypcję (/subscribe).")
+
+    async def show_subscriptions(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat = self.subscriptions.get(update.effective_chat.id)
+        if chat is None:
+            await update.message.reply_text("Brak subskrypcji. Użyj /subscribe PARA lub /subscribe all.")
+            return
+        symbols = "wszystkie pary" if ALL in chat['symbols'] else ", ".join(sorted(chat['symbols']))
+        await update.message.reply_text(f"<b>🔔 Twoje subskrypcje:</b> {symbols}\n<b>Sygnały:</b> {', '.join(sorted(chat['types']))}",
+                                        parse_mode='HTML')
+
+    @staticmethod
+    def _format_signal_message(signal_data):
         signal_type = signal_data['type']
         symbol = signal_data.get('symbol', 'N/A')
         price = signal_data['price']
         timestamp = signal_data['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
         reason = signal_data['reason']
         emoji = '🟢 BUY SIGNAL 🟢' if signal_type == 'BUY' else '🔴 SELL SIGNAL 🔴'
-        message = f"<b>{emoji}</b>\n\n<b>Symbol:</b> {symbol}\n<b>Cena:</b> {price:.4f} USDC\n<b>Czas:</b> {timestamp}\n<b>Powód:</b> {reason}\n\n<i>To nie jest porada finansowa.</i>"
+        strategy = f"<b>Strategia:</b> {signal_data['strategy']}\n" if signal_data.get('strategy') else ""
+        message = f"<b>{emoji}</b>\n\n<b>Symbol:</b> {symbol}\n{strategy}<b>Cena:</b> {price:.4f} USDC\n<b>Czas:</b> {timestamp}\n<b>Powód:</b> {reason}\n\n<i>To nie jest porada finansowa.</i>"
         return message
+
+    @staticmethod
+    def _format_digest_message(signals):
+        lines = [f"<b>📬 Sygnały zbiorcze ({len(signals)})</b>\n"]
+        reasons = {signal_data['reason'] for signal_data in signals}
+        for signal_data in signals:
+            emoji = '🟢 BUY' if signal_data['type'] == 'BUY' else '🔴 SELL'
+            timestamp = signal_data['timestamp'].strftime('%Y-%m-%d %H:%M')
+            strategy = f" [{signal_data['strategy']}]" if signal_data.get('strategy') else ""
+            line = f"{emoji} <b>{signal_data.get('symbol', 'N/A')}</b>{strategy}: {signal_data['price']:.4f} ({timestamp})"
+            # Różne strategie - powód przy każdym sygnale, wspólny powód - raz pod listą
+            if len(reasons) > 1:
+                line += f"\n    {signal_data['reason']}"
+            lines.append(line)
+        if len(reasons) == 1:
+            lines.append(f"\n<b>Powód:</b> {signals[0]['reason']}")
+        lines.append("\n<i>To nie jest porada finansowa.</i>")
+        return "\n".join(lines)
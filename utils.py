@@ -1,16 +1,49 @@
-import json
-import logging
-
-SYMBOLS_FILE = 'monitored_symbols.json'
-
-def load_symbols():
-    try:
-        with open(SYMBOLS_FILE, 'r') as f:
-            data = json.load(f)
-            return data.get('symbols', [])
-    except FileNotFoundError:
-        return []
-
-def save_symbols(symbols):
-    with open(SYMBOLS_FILE, 'w') as f:
-        json.dump({'symbols': symbols}, f, indent=4)
+import asyncio
+from config import EXCHANGE_ID
+
+# Symbole mogą wskazywać giełdę: "kraken:BTC/USD". Bez prefiksu oznaczają giełdę domyślną (EXCHANGE_ID),
+# więc dotychczasowe wpisy w rodzaju "BTC/USDC" działają bez zmian.
+
+def parse_symbol(symbol):
+    # Zwraca (giełda, para); dwukropek w parze (np. kontrakty "BTC/USDT:USDT") nie jest prefiksem giełdy
+    prefix, separator, market = symbol.partition(':')
+    if separator and '/' not in prefix:
+        return prefix.lower(), market
+    return EXCHANGE_ID, symbol
+
+def qualify_symbol(exchange_id, market):
+    return market if exchange_id == EXCHANGE_ID else f"{exchange_id}:{market}"
+
+def normalize_symbol(symbol):
+    # Postać kanoniczna: giełda małymi literami, para wielkimi, bez prefiksu dla giełdy domyślnej
+    exchange_id, market = parse_symbol(symbol.strip())
+    return qualify_symbol(exchange_id, market.upper())
+
+def timeframe_to_seconds(timeframe):
+    # Zamiana interwału w notacji ccxt (np. '15m', '1h', '4h', '1d') na sekundy
+    units = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    amount, unit = timeframe[:-1], timeframe[-1]
+    if unit not in units or not amount.isdigit():
+        raise ValueError(f"Nieobsługiwany interwał czasowy: {timeframe}")
+    return int(amount) * units[unit]
+
+# Świece tygodniowe na giełdach zaczynają się w poniedziałek, a epoka Unix (1970-01-01) to czwartek
+WEEK_OFFSET_SECONDS = 4 * 86400
+
+def timeframe_offset_seconds(timeframe):
+    # Przesunięcie granic świec względem epoki Unix
+    return WEEK_OFFSET_SECONDS if timeframe.endswith('w') else 0
+
+class SingleFlight:
+    # Równoczesne wywołania dla tego samego klucza czekają na jedno wspólne wykonanie
+    def __init__(self):
+        self._inflight = {}
+
+    async def run(self, key, factory):
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: anulowanie jednego oczekującego nie przerywa pracy pozostałych
+        return await asyncio.shield(future)
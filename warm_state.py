@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import numpy as np
+
+WARM_STATE_FILE = 'warm_state.json'
+
+class WarmState:
+    # Stan bota zapisywany okresowo i wczytywany przy starcie, aby po restarcie nie pobierać od nowa pełnej historii,
+    # listy rynków ani nie wysyłać ponownie tych samych sygnałów. Świece wszystkich symboli trafiają do jednej tablicy
+    # NumPy (.npy, wiersze [timestamp, open, high, low, close, volume]) mapowanej przy odczycie z dysku (mmap),
+    # a w JSON-ie są granice wierszy każdego symbolu, metadane rynków i ostatnie sygnały.
+    # Stan wskaźników strumieniowych nie jest zapisywany - odtwarza się lokalnie z wczytanych świec w pierwszym cyklu.
+    def __init__(self, path=WARM_STATE_FILE):
+        self.path = path
+
+    def _candles_path(self, name):
+        return os.path.join(os.path.dirname(self.path), name)
+
+    def collect(self, candle_store, exchange_client, last_signals):
+        # Kopia stanu w pętli zdarzeń (szybka), zapis na dysk osobno - poza pętlą
+        symbols, rows, offset = {}, [], 0
+        for symbol, buffer in candle_store.buffers.items():
+            if not len(buffer):
+                continue
+            block = np.empty((len(buffer), 6), dtype=np.float64)
+            block[:, 0] = buffer.timestamps
+            block[:, 1:] = buffer.ohlcv
+            rows.append(block)
+            symbols[symbol] = [offset, len(block), candle_store.refreshed_at.get(symbol, 0.0)]
+            offset += len(block)
+        meta = {
+            'saved_at': time.time(),
+            'base_timeframe': candle_store.base_timeframe,
+            'symbols': symbols,
+            'markets': exchange_client.market_state(list(symbols)),
+            'last_signals': {symbol: dict(signals) for symbol, signals in last_signals.items() if signals},
+        }
+        candles = np.concatenate(rows) if rows else np.empty((0, 6), dtype=np.float64)
+        return meta, candles
+
+    def write(self, meta, candles):
+        # Świece do nowego pliku (nazwa z czasem zapisu), potem JSON wskazujący na niego - oba przez os.replace,
+        # więc przerwany zapis zostawia poprzedni, spójny stan
+        previous = self.read_meta()
+        name = f"{os.path.basename(self.path)}.{int(meta['saved_at'] * 1000)}.npy"
+        tmp_path = self._candles_path(name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, candles)
+        os.replace(tmp_path, self._candles_path(name))
+        meta = {**meta, 'candles_file': name}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, default=str)
+        os.replace(tmp_path, self.path)
+        if previous and previous.get('candles_file') not in (None, name):
+            try:
+                os.remove(self._candles_path(previous['candles_file']))
+            except FileNotFoundError:
+                pass
+
+    def save(self, candle_store, exchange_client, last_signals):
+        self.write(*self.collect(candle_store, exchange_client, last_signals))
+
+    def read_meta(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logging.error(f"Uszkodzony plik stanu {self.path}: {e}")
+            return None
+
+    def restore(self, candle_store, exchange_client, last_signals, symbols):
+        # Wczytuje stan tylko dla podanych (monitorowanych) symboli; zwraca liczbę symboli z odtworzonymi świecami
+        meta = self.read_meta()
+        if not meta:
+            return 0
+        if meta.get('base_timeframe') != candle_store.base_timeframe:
+            logging.info("Zapisany stan dotyczy innego interwału bazowego, pomijam go.")
+            return 0
+        try:
+            candles = np.load(self._candles_path(meta['candles_file']), mmap_mode='r')
+        except (KeyError, OSError, ValueError) as e:
+            logging.error(f"Nie można wczytać zapisanych świec: {e}")
+            return 0
+        wanted = set(symbols)
+        restored = 0
+        for symbol, (offset, length, refreshed_at) in meta.get('symbols', {}).items():
+            if symbol in wanted and offset + length <= len(candles):
+                candle_store.restore(symbol, candles[offset:offset + length], refreshed_at)
+                restored += 1
+        del candles
+        age = max(time.time() - meta['saved_at'], 0.0)
+        exchange_client.restore_markets(meta.get('markets', {}), age)
+        for symbol, signals in meta.get('last_signals', {}).items():
+            # {strategia: typ}; stan z wersji z jedną strategią (sam typ) jest pomijany
+            if symbol in wanted and isinstance(signals, dict):
+                last_signals[symbol] = signals
+        logging.info(f"Wczytano zapisany stan sprzed {age:.0f}s: świece {restored} par, "
+                     f"ostatnie sygnały {len(last_signals)} par.")
+        return restored
+
+    async def run(self, candle_store, exchange_client, last_signals, interval):
+        # Zadanie w tle: okresowy zapis stanu (zapis na dysk w osobnym wątku)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.write, *self.collect(candle_store, exchange_client, last_signals))
+            except Exception as e:
+                logging.error(f"Błąd zapisu stanu: {e}", exc_info=True)
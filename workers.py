@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from candle_store import CandleView
+from resampler import resample_ohlcv
+from shared_series import attach_series
+from strategy_analyzer import StrategyAnalyzer
+from utils import timeframe_to_seconds
+
+# Tryb wieloprocesowy: proces główny (koordynator) pobiera świece do buforów w pamięci współdzielonej
+# i obsługuje Telegrama, a obliczenia wskaźników dla symboli rozdzielane są na procesy analizy.
+# Każdy symbol ma stały proces (shard), dzięki czemu wskaźniki strumieniowe są tam aktualizowane
+# przyrostowo; do procesów trafiają tylko nazwy bloków i granice danych, a wracają statusy i snapshoty.
+
+class ShardMap:
+    # Przypisanie symboli do procesów: nowe trafiają do najmniej obciążonego, a przy nierównowadze
+    # (po dodaniu lub usunięciu par) pojedyncze symbole są przenoszone z najbardziej do najmniej obciążonego
+    def __init__(self, shards):
+        self.shards = shards
+        self.assignment = {}
+
+    def groups(self):
+        groups = [[] for _ in range(self.shards)]
+        for symbol, shard in self.assignment.items():
+            groups[shard].append(symbol)
+        return groups
+
+    def update(self, symbols):
+        # Zwraca zbiór symboli przeniesionych między procesami (ich stan wskaźników liczony jest od nowa)
+        symbols = list(dict.fromkeys(symbols))
+        wanted = set(symbols)
+        for symbol in [s for s in self.assignment if s not in wanted]:
+            del self.assignment[symbol]
+        loads = [0] * self.shards
+        for shard in self.assignment.values():
+            loads[shard] += 1
+        for symbol in symbols:
+            if symbol not in self.assignment:
+                shard = loads.index(min(loads))
+                self.assignment[symbol] = shard
+                loads[shard] += 1
+
+        moved = set()
+        groups = self.groups()
+        while max(loads) - min(loads) > 1:
+            source, target = loads.index(max(loads)), loads.index(min(loads))
+            symbol = groups[source].pop()
+            groups[target].append(symbol)
+            self.assignment[symbol] = target
+            loads[source] -= 1
+            loads[target] += 1
+            moved.add(symbol)
+        return moved
+
+# --- Proces analizy ---
+
+_worker = {}
+
+def _init_worker(params, base_timeframe, macro_timeframe, micro_timeframe):
+    analyzer = StrategyAnalyzer(params)
+    _worker.update(analyzer=analyzer, engine=analyzer.create_engine(), attached={},
+                   timeframes=(base_timeframe, macro_timeframe, micro_timeframe),
+                   bar_ms=(timeframe_to_seconds(macro_timeframe) * 1000, timeframe_to_seconds(micro_timeframe) * 1000))
+
+def _attach(symbol, name, size):
+    # Dołączone bloki są zapamiętywane; nowy blok symbolu (np. po pełnym przeładowaniu historii) zastępuje stary
+    attached = _worker['attached']
+    entry = attached.get(symbol)
+    if entry is None or entry[0] != name:
+        _detach(symbol)
+        shm, series = attach_series(name, size)
+        entry = attached[symbol] = (name, shm, series)
+    return entry[2]
+
+def _detach(symbol):
+    entry = _worker['attached'].pop(symbol, None)
+    if entry:
+        shm = entry[1]
+        del entry
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+def _closed(timestamps, ohlcv, base_timeframe, timeframe, now_ms):
+    # Jak CandleStore.closed: widok zamkniętych świec interwału (wyliczonego z bazowego)
+    if timeframe != base_timeframe:
+        timestamps, ohlcv = resample_ohlcv(timestamps, ohlcv, base_timeframe, timeframe)
+    view = CandleView(timestamps, ohlcv)
+    n = view.closed_count(timeframe_to_seconds(timeframe) * 1000, now_ms)
+    return timestamps, ohlcv, n
+
+def _analyze_shard(tasks, now_ms, keep):
+    # tasks: lista (symbol, nazwa bloku, rozmiar, początek, koniec) - symbole do analizy w tym cyklu;
+    # keep: wszystkie symbole tego procesu (stan pozostałych jest zachowywany do kolejnego cyklu)
+    analyzer, engine = _worker['analyzer'], _worker['engine']
+    base_timeframe, macro_timeframe, micro_timeframe = _worker['timeframes']
+    results = {}
+    for symbol, name, size, start, end in tasks:
+        try:
+            timestamps, ohlcv = _attach(symbol, name, size)
+        except FileNotFoundError:
+            # Blok zwolniony przed dołączeniem (para usunięta z listy w trakcie cyklu)
+            results[symbol] = (None, None, [])
+            continue
+        timestamps, ohlcv = timestamps[start:end], ohlcv[start:end]
+        macro_ts, macro_ohlcv, macro_n = _closed(timestamps, ohlcv, base_timeframe, macro_timeframe, now_ms)
+        micro_ts, micro_ohlcv, micro_n = _closed(timestamps, ohlcv, base_timeframe, micro_timeframe, now_ms)
+        if not len(macro_ts) or not len(micro_ts):
+            results[symbol] = (None, None, [])
+            continue
+        engine.sync(symbol, macro_ts[:macro_n], macro_ohlcv[:macro_n], micro_ts[:micro_n], micro_ohlcv[:micro_n],
+                    bar_ms=_worker['bar_ms'])
+        snapshot = engine.snapshot(symbol)
+        results[symbol] = (analyzer.evaluate(snapshot), snapshot, engine.take_missed(symbol))
+
+    symbols = set(keep)
+    engine.retain(symbols)
+    for symbol in [s for s in _worker['attached'] if s not in symbols]:
+        _detach(symbol)
+    return results
+
+# --- Koordynator ---
+
+class AnalysisWorkers:
+    def __init__(self, candle_store, strategy_analyzer, workers, macro_timeframe, micro_timeframe):
+        # Bufory candle_store muszą być w pamięci współdzielonej (CandleStore(..., shared=True))
+        self.candle_store = candle_store
+        self.shards = ShardMap(workers)
+        initargs = (strategy_analyzer.params, candle_store.base_timeframe, macro_timeframe, micro_timeframe)
+        # Osobna pula jednoprocesowa na shard - zadania symbolu zawsze trafiają do procesu z jego stanem
+        self.executors = [ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=initargs)
+                          for _ in range(workers)]
+        logging.info(f"Uruchomiono {workers} procesów analizy.")
+
+    def _task(self, symbol):
+        buffer = self.candle_store.buffers.get(symbol)
+        if buffer is None or not len(buffer) or buffer.shm is None:
+            return None
+        return (symbol, *buffer.shared_ref())
+
+    async def analyze(self, symbols, now_ms=None):
+        # Zwraca {symbol: (status, snapshot, missed)} - status i snapshot jak SnapshotCache.evaluate, missed jak
+        # IndicatorEngine.take_missed (świece pominięte od poprzedniej analizy pary); (None, None, []), gdy brak danych.
+        # symbols może być częścią monitorowanych par - usunięte pary zdejmuje z podziału shards.update (forget_symbols)
+        new = [symbol for symbol in symbols if symbol not in self.shards.assignment]
+        if new:
+            moved = self.shards.update([*self.shards.assignment, *new])
+            if moved:
+                logging.info(f"Przeniesiono {len(moved)} symboli między procesami analizy.")
+        wanted = set(symbols)
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        loop = asyncio.get_running_loop()
+        results = dict.fromkeys(symbols, (None, None, []))
+        # Wycinki z shared_ref są ważne tylko do następnej zmiany bufora - odświeżenia (np. z komend bota)
+        # czekają z zapisem do końca analizy
+        async with self.candle_store.lock:
+            jobs = []
+            for executor, group in zip(self.executors, self.shards.groups()):
+                tasks = [task for task in map(self._task, group) if task is not None and task[0] in wanted]
+                jobs.append(loop.run_in_executor(executor, _analyze_shard, tasks, now_ms, group))
+            for shard_results in await asyncio.gather(*jobs):
+                results.update(shard_results)
+        return results
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown(cancel_futures=True)